@@ -0,0 +1,97 @@
+"""
+Multi-threaded stress benchmark of resolveAsset and resolvePath, like
+Katana calling the asset plug-in from several threads while cooking the
+scene graph.
+
+Template evaluations take TEMPLATE_LATENCY seconds, like Toolkit walking
+the file system. Without caching, every call evaluates the template. With
+the plug-in caches, each asset ID is evaluated once, by a single thread,
+however many threads ask for it. Runs with the Python 2 interpreter Katana
+uses:
+
+    python benchmarks/bench_concurrent_resolve.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+from helpers import FakeTank, load_asset_plugin, make_asset_id
+
+
+THREADS = 16
+CALLS_PER_THREAD = 5000
+DISTINCT_ASSETS = 200
+TEMPLATE_LATENCY = 0.002
+
+
+class SlowTank(FakeTank):
+
+    def __init__(self):
+        super(SlowTank, self).__init__()
+        self._lock = threading.Lock()
+
+    def abstract_paths_from_template(self, template, fields):
+        time.sleep(TEMPLATE_LATENCY)
+        with self._lock:
+            self.evaluations += 1
+        return [u"/%s/v%s.%%04d.exr" % (fields["Shot"], fields.get("version"))]
+
+
+def run_threads(resolve, calls):
+    """
+    Runs resolve(assetId, frame) calls times from each of THREADS threads at
+    once, all going through the same asset IDs, and returns the wall time
+    and failures.
+    """
+    assetIds = [make_asset_id("sh%04d" % index, 1) for index in range(DISTINCT_ASSETS)]
+    failures = []
+    start = threading.Event()
+
+    def work(offset):
+        start.wait()
+        for call in range(calls):
+            index = (call + offset) % DISTINCT_ASSETS
+            frame = call % 100
+            expected = "/sh%04d/v1.%04d.exr" % (index, frame)
+            if resolve(assetIds[index], frame) != expected:
+                failures.append(assetIds[index])
+
+    threads = [threading.Thread(target=work, args=(offset,)) for offset in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    startTime = time.time()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return time.time() - startTime, failures
+
+
+def main():
+    module = load_asset_plugin()
+    print "%d threads x %d resolvePath calls over %d asset IDs, %gms per template evaluation:" % (
+        THREADS, CALLS_PER_THREAD, DISTINCT_ASSETS, TEMPLATE_LATENCY * 1000)
+
+    tank = SlowTank()
+    template = tank.templates["shot_publish"]
+
+    def resolve_uncached(assetId, frame):
+        fields = module.parseAssetId(assetId).getFields()
+        return str(tank.abstract_paths_from_template(template, fields)[0]) % frame
+
+    # Without caching every call evaluates the template, only time a tenth
+    seconds, failures = run_threads(resolve_uncached, CALLS_PER_THREAD // 10)
+    print "  no cache (1/10 of the calls)  %7.3fs  %6d evaluations  %d failures" % (
+        seconds, tank.evaluations, len(failures))
+
+    plugin = module.ShotgunAssetPlugin()
+    plugin.tk = SlowTank()
+    seconds, failures = run_threads(plugin.resolvePath, CALLS_PER_THREAD)
+    print "  plug-in caches                %7.3fs  %6d evaluations  %d failures" % (
+        seconds, plugin.tk.evaluations, len(failures))
+    assert not failures and plugin.tk.evaluations == DISTINCT_ASSETS
+
+
+if __name__ == "__main__":
+    main()
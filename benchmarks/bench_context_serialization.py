@@ -0,0 +1,64 @@
+"""
+Size of TANK_CONTEXT and cost of decoding it, for a typical shot task
+context holding the serialized session user.
+
+Compares the sgtk.context.serialize() blob the launcher used to hand over
+with the compact form of the context registry, with the stand-in sgtk of the
+tests pickling the context like Toolkit does. Runs with the Python 2
+interpreter Katana uses:
+
+    python benchmarks/bench_context_serialization.py
+"""
+import os
+import imp
+import sys
+import pickle
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+from helpers import ROOT_PATH
+import sgtk
+
+
+DECODES = 20000
+
+SESSION_USER = pickle.dumps({
+    "login": "jdoe",
+    "session_token": "a1b2c3d4e5f60718293a4b5c6d7e8f90",
+    "host": "https://studio.shotgunstudio.com",
+    "http_proxy": None,
+    "session_metadata": None,
+    "user_type": "session",
+})
+
+CONTEXT_DATA = {
+    "project": {"type": "Project", "id": 122, "name": "big_buck_bunny"},
+    "entity": {"type": "Shot", "id": 11230, "name": "bbb_010_0040"},
+    "step": {"type": "Step", "id": 6, "name": "Lighting"},
+    "task": {"type": "Task", "id": 50981, "name": "lighting"},
+    "user": {"type": "HumanUser", "id": 88, "name": "Jane Doe"},
+    "additional_entities": [],
+    "source_entity": {"type": "Task", "id": 50981, "name": "lighting"},
+    "_pc_path": "/mnt/pipeline/configs/big_buck_bunny/primary",
+    "_current_user": SESSION_USER,
+}
+
+
+def main():
+    registry = imp.load_source("tk_katana_context", os.path.join(
+        ROOT_PATH, "resources", "Katana", "python", "tk_katana_context.py"))
+    context = sgtk.context.Context(CONTEXT_DATA)
+
+    legacy = sgtk.context.serialize(context)
+    compact = registry.serialize(context)
+    assert registry.deserialize(compact) == registry.deserialize(legacy) == context
+
+    print "size    legacy %4d bytes  compact %4d bytes" % (len(legacy), len(compact))
+    legacy_time = timeit.timeit(lambda: registry.deserialize(legacy), number=DECODES)
+    compact_time = timeit.timeit(lambda: registry.deserialize(compact), number=DECODES)
+    print "decode  legacy %6.1fus    compact %6.1fus" % (
+        legacy_time / DECODES * 1e6, compact_time / DECODES * 1e6)
+
+
+if __name__ == "__main__":
+    main()
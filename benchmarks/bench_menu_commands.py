@@ -0,0 +1,63 @@
+"""
+Cost of building the Shotgun menu from 1,000 commands of 200 apps, 100 of
+them favourites, with a stand-in engine and fake Qt classes.
+
+Compares finding the instance name of every command's app by scanning
+engine.apps and its favourite by comparing it with every favourite, which
+get_all_app_commands used to do, with the prebuilt indexes. Runs with the
+Python 2 interpreter Katana uses:
+
+    python benchmarks/bench_menu_commands.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+from helpers import FakeMenuEngine, get_menu_generator_class
+from tk_katana.menu_generation import AppCommand
+
+
+APP_COUNT = 200
+COMMANDS_PER_APP = 5
+FAVOURITE_COUNT = 100
+
+
+def get_all_app_commands_before(engine):
+    """
+    What get_all_app_commands used to do.
+    """
+    commands = []
+    favourites = engine.get_setting("menu_favourites", default=[])
+    for cmd_name, cmd_details in sorted(engine.commands.items()):
+        # Without the index, AppCommand scans engine.apps
+        app_command = AppCommand(engine, cmd_name, cmd_details)
+        app_command.favourite = any(app_command == item for item in favourites)
+        commands.append(app_command)
+    return commands
+
+
+def main():
+    engine = FakeMenuEngine(APP_COUNT, COMMANDS_PER_APP, FAVOURITE_COUNT)
+    menu_generator_class = get_menu_generator_class()
+    print "%d commands of %d apps, %d favourites:" % (
+        len(engine.commands), APP_COUNT, FAVOURITE_COUNT)
+
+    start = time.time()
+    before = get_all_app_commands_before(engine)
+    print "  commands, scans and comparisons  %7.1fms" % ((time.time() - start) * 1000)
+
+    start = time.time()
+    menu_generator = menu_generator_class(engine, "Shotgun")
+    print "  whole menu, with the indexes     %7.1fms" % ((time.time() - start) * 1000)
+
+    start = time.time()
+    after = menu_generator.get_all_app_commands()
+    print "  commands, with the indexes       %7.1fms" % ((time.time() - start) * 1000)
+
+    assert [(command.name, command.app_instance_name, command.favourite) for command in before] == \
+        [(command.name, command.app_instance_name, command.favourite) for command in after]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Parse cost per call of the asset IDs given to the Shotgun asset plug-in.
+
+Compares the eval() of the asset ID by isAssetId, getAssetFields and
+__getAssetPublishType that each resolveAsset used to run, with the strict
+parser and its cache. Runs with the Python 2 interpreter Katana uses:
+
+    python benchmarks/bench_parse_asset_ids.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+from helpers import load_asset_plugin, make_asset_id
+
+
+COUNT = 100000
+
+
+def parse_with_eval(assetId):
+    """
+    What resolveAsset used to do to parse an asset ID.
+    """
+    fullDict = eval(str(assetId))
+    fullDict.has_key("template") and fullDict.has_key("fields")
+    eval(str(assetId)).get("fields")
+    eval(str(assetId)).get("template")
+
+
+def main():
+    module = load_asset_plugin()
+    distinctIds = [make_asset_id("sh%05d" % index, index % 7 + 1) for index in range(COUNT)]
+    # A scene evaluation resolves the same few asset IDs over and over
+    repeatedIds = [distinctIds[index % 1000] for index in range(COUNT)]
+
+    print "%d synthetic asset IDs, microseconds per call:" % COUNT
+    for label, assetIds in (("distinct", distinctIds), ("1,000 repeated", repeatedIds)):
+        before = timeit.timeit(lambda: [parse_with_eval(assetId) for assetId in assetIds], number=1)
+        plugin = module.ShotgunAssetPlugin()
+        after = timeit.timeit(lambda: [plugin.getAssetFields(assetId) for assetId in assetIds], number=1)
+        print "  %-15s eval x3 %6.2f   parser + cache %6.2f" % (
+            label, before / COUNT * 1e6, after / COUNT * 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Cost of resolveAllAssets on a 1 MB argument string holding 10k asset
+references, e.g. the arguments of a procedural.
+
+Compares the split, check and replace of every token that resolveAllAssets
+used to run with the single pass tokenizer. Runs with the Python 2
+interpreter Katana uses:
+
+    python benchmarks/bench_resolve_all_assets.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+from helpers import FakeTank, load_asset_plugin, make_asset_id
+
+
+SIZE = 1024 * 1024
+REFERENCES = 10000
+DISTINCT_ASSETS = 500
+
+
+def resolve_all_assets_before(plugin, string):
+    """
+    What resolveAllAssets used to do, with the eval() based checks.
+    """
+    result = string
+    for token in string.split():
+        try:
+            fullDict = eval(str(token))
+            isAssetId = "template" in fullDict and "fields" in fullDict
+        except Exception:
+            isAssetId = False
+        if isAssetId:
+            fields = eval(str(token))["fields"]
+            path = str(plugin.tk.abstract_paths_from_template(None, fields)[0])
+            result = result.replace(token, path)
+    return result
+
+
+def make_arguments():
+    """
+    Returns a string of about SIZE bytes holding REFERENCES asset IDs.
+    """
+    assetIds = [make_asset_id("sh%04d" % index, 1).replace(" ", "")
+                for index in range(DISTINCT_ASSETS)]
+    references = [assetIds[index % DISTINCT_ASSETS] for index in range(REFERENCES)]
+    # The other tokens are distinct paths, like the files of a command line
+    padding = "/show/plates/%07d.exr"
+    filler = (SIZE - sum(len(reference) + 1 for reference in references)) // (len(padding % 0) + 1)
+    tokens = references + [padding % index for index in range(filler)]
+    # Spread the references along the string
+    tokens.sort(key=lambda token: hash(token) % 9973)
+    return " ".join(tokens)
+
+
+def main():
+    module = load_asset_plugin()
+    arguments = make_arguments()
+    print "%d bytes, %d asset references to %d assets:" % (
+        len(arguments), REFERENCES, DISTINCT_ASSETS)
+
+    plugin = module.ShotgunAssetPlugin()
+    plugin.tk = FakeTank()
+    start = time.time()
+    expected = resolve_all_assets_before(plugin, arguments)
+    print "  split and replace  %7.3fs" % (time.time() - start)
+
+    plugin = module.ShotgunAssetPlugin()
+    plugin.tk = FakeTank()
+    start = time.time()
+    result = plugin.resolveAllAssets(arguments)
+    print "  single pass        %7.3fs" % (time.time() - start)
+    assert result == expected
+    print "  %d parsed strings cached" % len(plugin._assetIdCache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Time taken to find the Katana rez packages of four repositories, one of them
+a dead network mount, with the stand-in rez of the tests.
+
+Compares the single search of all repositories the launcher used to run with
+the parallel scan, cold and with its cache. Runs with the Python 2
+interpreter Katana uses:
+
+    python benchmarks/bench_rez_scan.py
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+from helpers import FAKE_REZ_PATH, ROOT_PATH, load_startup
+
+
+# Search time in seconds and Katana versions of each repository
+REPOSITORIES = [
+    (0.05, ["3.0v7", "3.5v2"]),
+    (0.4, ["3.5v2", "4.0v1"]),
+    (0.8, ["3.6v1"]),
+    (30, ["9.9v9"]),
+]
+
+TIMEOUT = 2
+
+
+def main():
+    temp_dir = tempfile.mkdtemp()
+    tempfile.tempdir = temp_dir
+    try:
+        repositories = []
+        for index, (delay, versions) in enumerate(REPOSITORIES):
+            repository = os.path.join(temp_dir, "repository%d" % index)
+            for version in versions:
+                os.makedirs(os.path.join(repository, "katana", version))
+            repositories.append(repository)
+        os.environ["REZ_PACKAGES_PATH"] = os.pathsep.join(repositories)
+
+        class BenchmarkLauncher(load_startup().KatanaLauncher):
+
+            REZ_REPOSITORY_TIMEOUT = TIMEOUT
+
+            def get_rez_root_command(self):
+                return "echo %s" % FAKE_REZ_PATH
+
+        launcher = BenchmarkLauncher(disk_location=ROOT_PATH)
+
+        launcher._import_rez()
+        from rez import package_search
+        for repository, (delay, versions) in zip(repositories, REPOSITORIES):
+            package_search.g_search_delays[repository] = delay
+
+        # The dead repository would hang a single search, it is left out
+        start = time.time()
+        searcher = package_search.ResourceSearcher(package_paths=repositories[:-1])
+        searcher.search("katana")
+        print "single search, live repositories  %7.3fs" % (time.time() - start)
+
+        # The dead repository is never cached, so it always costs the timeout
+        for label in ("parallel, cold", "parallel, cached"):
+            start = time.time()
+            packages = launcher._find_rez_packages("katana")
+            print "%-33s %7.3fs  %s" % (label, time.time() - start, ", ".join(packages))
+
+        os.environ["REZ_PACKAGES_PATH"] = os.pathsep.join(repositories[:-1])
+        start = time.time()
+        launcher._find_rez_packages("katana")
+        print "%-33s %7.3fs" % ("parallel, live only, cached", time.time() - start)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,14 @@ A Katana engine for Tank.
 """
 import os
 import sys
+import json
+import time
 import ctypes
 import shutil
 import logging
+import thread
 import traceback
+import contextlib
 
 import tank
 
@@ -18,6 +22,95 @@ from Katana import Configuration
 from Katana import Callbacks
 
 
+# When set, the start-up phases are recorded and written to the file it names
+# as Chrome trace-event JSON, which chrome://tracing can display.
+STARTUP_TRACE_ENV_VAR = "TK_KATANA_STARTUP_TRACE"
+
+
+class StartupTracer(object):
+    """
+    Records the spans of the engine start-up phases as Chrome trace events.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The file the trace is written to.
+        """
+        self.path = path
+        self._events = []
+
+    @classmethod
+    def from_environment(cls):
+        """
+        Returns a tracer writing to the file named by TK_KATANA_STARTUP_TRACE,
+        or None if start-up tracing is not enabled.
+        """
+        path = os.environ.get(STARTUP_TRACE_ENV_VAR)
+        if path:
+            return cls(path)
+
+    def add_span(self, name, start, end, category="startup"):
+        """
+        Records a span between two time.time() values.
+        """
+        self._events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": int(start * 1000000),
+            "dur": int((end - start) * 1000000),
+            "pid": os.getpid(),
+            "tid": thread.get_ident(),
+        })
+
+    @contextlib.contextmanager
+    def span(self, name, category="startup"):
+        """
+        Records a span covering the body of a with statement.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.time(), category)
+
+    @contextlib.contextmanager
+    def tracing_app_init(self):
+        """
+        Records a span for the init of each app loaded by the engine within
+        the body of a with statement.
+        """
+        from tank.platform import application
+        get_application = application.get_application
+        tracer = self
+
+        def traced_get_application(*args, **kwargs):
+            app = get_application(*args, **kwargs)
+            init_app = app.init_app
+
+            def traced_init_app():
+                with tracer.span("init_app %s" % app.instance_name, "app"):
+                    return init_app()
+            app.init_app = traced_init_app
+            return app
+
+        application.get_application = traced_get_application
+        try:
+            yield
+        finally:
+            application.get_application = get_application
+
+    def write(self):
+        """
+        Writes the spans recorded so far to the trace file.
+        """
+        try:
+            with open(self.path, "w") as trace_file:
+                json.dump({"traceEvents": self._events}, trace_file)
+        except (IOError, OSError), e:
+            print "Shotgun Warning: Could not write start-up trace %s: %s" % (self.path, e)
+
+
 class KatanaEngine(tank.platform.Engine):
     """
     An engine that supports Katana.
@@ -25,8 +118,31 @@ class KatanaEngine(tank.platform.Engine):
 
     def __init__(self, *args, **kwargs):
         self._ui_enabled = bool(Configuration.get('KATANA_UI_MODE'))
-        super(KatanaEngine, self).__init__(*args, **kwargs)
-        
+        self._deferred_apps = None
+        self._startup_tracer = StartupTracer.from_environment()
+        if self._startup_tracer:
+            with self._startup_tracer.tracing_app_init():
+                with self._startup_tracer.span("KatanaEngine.__init__"):
+                    super(KatanaEngine, self).__init__(*args, **kwargs)
+            self._startup_tracer.write()
+        else:
+            super(KatanaEngine, self).__init__(*args, **kwargs)
+
+    @property
+    def startup_tracer(self):
+        """
+        The :class:`StartupTracer` recording the start-up of this engine, or
+        None if start-up tracing is not enabled.
+        """
+        return self._startup_tracer
+
+    def _trace(self, name):
+        """
+        Returns a context manager recording a start-up span if tracing is enabled.
+        """
+        if self._startup_tracer:
+            return self._startup_tracer.span(name)
+        return _null_context()
 
     @property
     def has_ui(self):
@@ -35,9 +151,17 @@ class KatanaEngine(tank.platform.Engine):
         """
         return self._ui_enabled
 
+    @property
+    def context_change_allowed(self):
+        """
+        Whether the engine can switch context without being restarted.
+        """
+        return True
+
     def init_engine(self):
-        self.log_debug("%s: Initializing..." % self)
-        os.environ["TANK_KATANA_ENGINE_INIT_NAME"] = self.instance_name
+        with self._trace("init_engine"):
+            self.log_debug("%s: Initializing..." % self)
+            os.environ["TANK_KATANA_ENGINE_INIT_NAME"] = self.instance_name
 
     
 
@@ -49,26 +173,74 @@ class KatanaEngine(tank.platform.Engine):
             menu_name = "Sgtk"
 
         tk_katana = self.import_module("tk_katana")
-        self._menu_generator = tk_katana.MenuGenerator(self, menu_name)
+        with self._trace("MenuGenerator"):
+            self._menu_generator = tk_katana.create_menu_generator(self, menu_name)
+        if self._startup_tracer:
+            # The menu may be created once Katana is done starting up
+            self._startup_tracer.write()
 
     def pre_app_init(self):
         """
         Called at startup.
         """
-        tk_katana = self.import_module("tk_katana")
+        with self._trace("pre_app_init"):
+            tk_katana = self.import_module("tk_katana")
 
-        # Make sure callbacks tracking the context switching are active.
-        tk_katana.tank_ensure_callbacks_registered()
+            # Make sure callbacks tracking the context switching are active.
+            tk_katana.tank_ensure_callbacks_registered()
+
+            # Only initialize apps when their commands are first run
+            if self.get_setting("defer_app_init", False):
+                self._deferred_apps = tk_katana.DeferredAppLoader(self)
+                self._deferred_apps.install()
 
     def post_app_init(self):
-        if self.has_ui:
+        with self._trace("post_app_init"):
+            if self._deferred_apps:
+                self._deferred_apps.uninstall()
+                self._deferred_apps.register_placeholder_commands()
+
+            if self.has_ui:
+                try:
+                    self.add_katana_menu()
+                except AttributeError:
+                    # Katana is probably not fully started and the main menu is not available yet
+                    Callbacks.addCallback(Callbacks.Type.onStartupComplete, self.add_katana_menu)
+                except:
+                    traceback.print_exc()
+
+                if self._deferred_apps and self.get_setting("prewarm_deferred_apps", False):
+                    self._deferred_apps.start_prewarm()
+
+    def rebuild_katana_menu(self):
+        """
+        Rebuilds the Shotgun menu in place, e.g. once the commands changed.
+        """
+        if self.has_ui and getattr(self, "_menu_generator", None):
+            start_time = time.time()
             try:
-                self.add_katana_menu()
-            except AttributeError:
-                # Katana is probably not fully started and the main menu is not available yet
-                Callbacks.addCallback(Callbacks.Type.onStartupComplete, self.add_katana_menu)
+                self._menu_generator.update(self)
             except:
                 traceback.print_exc()
+            else:
+                self.log_info("Updated Shotgun menu in %d ms."
+                              % ((time.time() - start_time) * 1000))
+
+    def pre_context_change(self, old_context, new_context):
+        """
+        Initializes the deferred apps which act on context changes.
+        """
+        if self._deferred_apps:
+            self._deferred_apps.prepare_context_change()
+
+    def post_context_change(self, old_context, new_context):
+        """
+        Keeps the other deferred apps deferred and rebuilds the Shotgun menu in
+        place once the context has changed.
+        """
+        if self._deferred_apps:
+            self._deferred_apps.follow_context_change()
+        self.rebuild_katana_menu()
 
     def destroy_engine(self):
         self.log_debug("%s: Destroying..." % self)
@@ -79,15 +251,29 @@ class KatanaEngine(tank.platform.Engine):
                 traceback.print_exc()
 
     def launch_command(self, cmd_id):
-        callback = self._callback_map.get(cmd_id)
-        if callback is None:
+        """
+        Runs the named command, initializing its app first if it was deferred.
+        """
+        command = self.commands.get(cmd_id)
+        if command is None:
             self.log_error("No callback found for id: %s" % cmd_id)
             return
-        callback()
+        command["callback"]()
 
     
+    def _define_qt5_base(self):
+        if not self.has_ui:
+            # Cores probing PySide2 through this would import Qt in batch too
+            self.log_debug("Katana is running without UI - Qt5 will not be set up.")
+            return {}
+        return super(KatanaEngine, self)._define_qt5_base()
+
     def _define_qt_base(self):
-        
+        if not self.has_ui:
+            # Batch sessions have no use for Qt, don't even try importing it
+            self.log_debug("Katana is running without UI - Qt will not be set up.")
+            return {"qt_core": None, "qt_gui": None, "dialog_base": None}
+
         try:
             from PySide2 import QtGui
         except:
@@ -148,3 +334,9 @@ class KatanaEngine(tank.platform.Engine):
         print "Shotgun Error: %s" % msg
 
 
+@contextlib.contextmanager
+def _null_context():
+    """
+    A context manager doing nothing.
+    """
+    yield
@@ -5,21 +5,33 @@
 import os
 import sys
 import tank
+import threading
+import time
 import traceback
 
 from Katana import Configuration
 from Katana import FarmAPI 
 from Katana import Callbacks
-from Katana import QtGui, QtCore
 
-from .menu_generation import MenuGenerator
-from .panels import KatanaPanelWidget
+from .deferred_apps import DeferredAppLoader
+
+# The UI modules, from Qt to the menu generator and panels, are only imported
+# when needed so that batch sessions never load them.
+
+
+def create_menu_generator(engine, menu_name):
+    """
+    Creates the Shotgun menu for the given engine.
+    """
+    from .menu_generation import MenuGenerator
+    return MenuGenerator(engine, menu_name)
 
 
 def __show_tank_message(title, msg):
     """
     Display a message in a dialog.
     """
+    from Katana import QtGui
     QtGui.QMessageBox.information(None, title, msg)
 
 
@@ -40,6 +52,8 @@ def __create_tank_disabled_menu(details):
     Creates a std "disabled" shotgun menu
     """
     if Configuration.get("KATANA_UI_MODE"):
+        from Katana import QtGui
+        from .menu_generation import MenuGenerator
         sg_menu = MenuGenerator.get_or_create_root_menu("Shotgun")
         if sg_menu is not None:
             sg_menu.clear()
@@ -50,12 +64,13 @@ def __create_tank_disabled_menu(details):
         print("The Shotgun Pipeline Toolkit is disabled: %s" % details)
 
 
-def __create_tank_error_menu():
+def __create_tank_error_menu(exc_info=None):
     """
     Creates a std "error" tank menu and grabs the current context.
-    Make sure that this is called from inside an except clause.
+    Make sure that this is called from inside an except clause, or pass
+    the sys.exc_info() of the error.
     """
-    (exc_type, exc_value, exc_traceback) = sys.exc_info()
+    (exc_type, exc_value, exc_traceback) = exc_info or sys.exc_info()
     message = ""
     message += "Message: Shotgun encountered a problem starting the Engine.\n"
     message += "Please contact support@shotgunsoftware.com\n\n"
@@ -64,6 +79,8 @@ def __create_tank_error_menu():
     message += "\n".join( traceback.format_tb(exc_traceback))
 
     if Configuration.get("KATANA_UI_MODE"):
+        from Katana import QtGui
+        from .menu_generation import MenuGenerator
         sg_menu = MenuGenerator.get_or_create_root_menu("Shotgun")
         if sg_menu is not None:
             sg_menu.clear()
@@ -74,11 +91,42 @@ def __create_tank_error_menu():
         print("The Shotgun Pipeline Toolkit caught an error: %s" % message)
 
 
+def __show_context_switching(switching):
+    """
+    Shows or removes a "Switching context..." entry at the top of the
+    Shotgun menu while the context of a new scene is being computed.
+    """
+    global g_switching_action
+    from Katana import QtGui
+    from .menu_generation import MenuGenerator
+    sg_menu = MenuGenerator.get_or_create_root_menu("Shotgun")
+    if sg_menu is None:
+        return
+
+    if g_switching_action is not None:
+        try:
+            sg_menu.removeAction(g_switching_action)
+        except RuntimeError:
+            # Already deleted along with the menu contents
+            pass
+        g_switching_action = None
+
+    if switching:
+        g_switching_action = QtGui.QAction("Switching context...", sg_menu)
+        g_switching_action.setEnabled(False)
+        actions = sg_menu.actions()
+        if actions:
+            sg_menu.insertAction(actions[0], g_switching_action)
+        else:
+            sg_menu.addAction(g_switching_action)
+
+
 def __engine_refresh(tk, new_context):
     """
     Checks the the tank engine should be
     """
     engine_name = os.environ.get("TANK_KATANA_ENGINE_INIT_NAME")
+    start_time = time.time()
 
     curr_engine = tank.platform.current_engine()
     if curr_engine:
@@ -86,6 +134,17 @@ def __engine_refresh(tk, new_context):
         if new_context == curr_engine.context:
             # no need to restart the engine!
             return
+        elif curr_engine.context_change_allowed and hasattr(tank.platform, "change_context"):
+            # switch the running engine to the new context, reusing its apps.
+            # Toolkit falls back to a restart if the environment differs.
+            try:
+                tank.platform.change_context(new_context)
+            except tank.TankEngineInitError, e:
+                # no tk-katana engine in the new context! - disable tank!
+                __create_tank_disabled_menu(e)
+            else:
+                __log_context_switch(new_context, start_time)
+            return
         else:
             # shut down the engine
             curr_engine.destroy()
@@ -96,6 +155,162 @@ def __engine_refresh(tk, new_context):
     except tank.TankEngineInitError, e:
         # context was not sufficient! - disable tank!
         __create_tank_disabled_menu(e)
+    else:
+        __log_context_switch(new_context, start_time)
+
+
+def __log_context_switch(new_context, start_time):
+    """
+    Reports how long switching to the given context took.
+    """
+    engine = tank.platform.current_engine()
+    if engine:
+        engine.log_info("Switched context to %s in %d ms."
+                        % (new_context, (time.time() - start_time) * 1000))
+
+
+# Tank instances created by the scene callbacks, keyed by pipeline configuration root
+g_tank_instances = {}
+
+# (current context, new context, tank instance) computed by the scene callbacks,
+# keyed by file name
+g_file_contexts = {}
+
+
+def __tank_from_path(file_name):
+    """
+    Returns a Tank instance for the given file, reusing the instances created
+    earlier in the session if the file is under one of their project roots.
+    """
+    norm_path = os.path.normcase(os.path.abspath(file_name))
+    for tk in g_tank_instances.values():
+        for root in tk.roots.values():
+            norm_root = os.path.normcase(root).rstrip(os.sep) + os.sep
+            if norm_path.startswith(norm_root):
+                return tk
+
+    tk = tank.tank_from_path(file_name)
+    g_tank_instances[tk.pipeline_configuration.get_path()] = tk
+    return tk
+
+
+def __context_from_path(file_name, curr_ctx):
+    """
+    Returns a (tank instance, context) pair for the given file, reusing the
+    result of an earlier call for the same file and current context.
+    """
+    cached = g_file_contexts.get(file_name)
+    if cached and cached[0] == curr_ctx:
+        return cached[2], cached[1]
+
+    tk = __tank_from_path(file_name)
+    new_ctx = tk.context_from_path(file_name, curr_ctx)
+    g_file_contexts[file_name] = (curr_ctx, new_ctx, tk)
+    return tk, new_ctx
+
+
+# The entry shown in the Shotgun menu while switching context
+g_switching_action = None
+
+# Guards the state shared with the context switch worker thread below
+g_switch_lock = threading.Lock()
+
+# (file name, current context) of the latest scene waiting for its context
+g_switch_request = None
+
+# (file name, tank instance, new context, exc_info) of the latest computed context
+g_switch_result = None
+
+# The thread computing contexts, if running
+g_switch_worker = None
+
+# Main thread timer applying the computed contexts
+g_switch_timer = None
+
+
+def __context_switch_worker():
+    """
+    Computes the contexts of the requested scenes in a worker thread.
+
+    Requests made while a context is being computed replace each other, and
+    a result is only published if no newer request came in meanwhile, so that
+    several quick loads lead to a single engine restart.
+    """
+    global g_switch_request, g_switch_result, g_switch_worker
+    while True:
+        with g_switch_lock:
+            request = g_switch_request
+            g_switch_request = None
+            if request is None:
+                g_switch_worker = None
+                return
+
+        file_name, curr_ctx = request
+        try:
+            tk, new_ctx = __context_from_path(file_name, curr_ctx)
+            result = (file_name, tk, new_ctx, None)
+        except Exception:
+            result = (file_name, None, None, sys.exc_info())
+
+        with g_switch_lock:
+            if g_switch_request is None:
+                g_switch_result = result
+
+
+def __apply_context_switch():
+    """
+    Polled on the main thread: once the worker thread is done, restarts the
+    engine with the latest computed context.
+    """
+    global g_switch_result
+    with g_switch_lock:
+        if g_switch_worker is not None or g_switch_request is not None:
+            # Still busy, a newer result will replace the current one
+            return
+        result = g_switch_result
+        g_switch_result = None
+
+    g_switch_timer.stop()
+    __show_context_switching(False)
+    if result is None:
+        return
+
+    file_name, tk, new_ctx, exc_info = result
+    if exc_info:
+        if isinstance(exc_info[1], tank.TankError):
+            __create_tank_disabled_menu(exc_info[1])
+        else:
+            __create_tank_error_menu(exc_info)
+        return
+
+    try:
+        __engine_refresh(tk, new_ctx)
+    except Exception, e:
+        __create_tank_error_menu()
+
+
+def __request_context_switch(file_name, curr_ctx):
+    """
+    Computes the context of the given scene file on a worker thread, and
+    switches the engine to it on the main thread once ready.
+    """
+    global g_switch_request, g_switch_worker, g_switch_timer
+    with g_switch_lock:
+        g_switch_request = (file_name, curr_ctx)
+        if g_switch_worker is None:
+            g_switch_worker = threading.Thread(
+                target=__context_switch_worker, name="tk-katana context switch")
+            g_switch_worker.daemon = True
+            g_switch_worker.start()
+
+    if g_switch_timer is None:
+        from Katana import QtCore
+        g_switch_timer = QtCore.QTimer()
+        g_switch_timer.setInterval(50)
+        g_switch_timer.timeout.connect(__apply_context_switch)
+    if not g_switch_timer.isActive():
+        __show_context_switching(True)
+        g_switch_timer.start()
 
 
 def __tank_on_scene_event_callback(**kwargs):
@@ -112,21 +327,28 @@ def __tank_on_scene_event_callback(**kwargs):
         return
 
     try:
-        # this file could be in another project altogether, so create a new Tank
-        # API instance.
-        try:
-            tk = tank.tank_from_path(file_name)
-        except tank.TankError, e:
-            __create_tank_disabled_menu(e)
-            return
-
         # try to get current ctx and inherit its values if possible
         curr_ctx = None
         if tank.platform.current_engine():
             curr_ctx = tank.platform.current_engine().context
 
-        # and now extract a new context based on the file
-        new_ctx = tk.context_from_path(file_name, curr_ctx)
+        cached = g_file_contexts.get(file_name)
+        if cached and cached[0] == curr_ctx and cached[1] == curr_ctx:
+            # Saved or reloaded in the context the engine already runs in
+            return
+
+        if Configuration.get("KATANA_UI_MODE"):
+            # Keep the UI responsive while the context is computed
+            __request_context_switch(file_name, curr_ctx)
+            return
+
+        # this file could be in another project altogether, so get a Tank
+        # API instance for it and extract a new context based on the file.
+        try:
+            tk, new_ctx = __context_from_path(file_name, curr_ctx)
+        except tank.TankError, e:
+            __create_tank_disabled_menu(e)
+            return
 
         # now restart the engine with the new context
         __engine_refresh(tk, new_ctx)
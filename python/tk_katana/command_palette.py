@@ -0,0 +1,234 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+from collections import defaultdict
+import re
+
+try:
+
+    from Katana import QtGui, QtCore ,QtWidgets
+
+except:
+
+    from Katana import QtGui, QtCore
+    QtWidgets = QtGui
+
+
+# Length of the word prefixes indexed, longer query words go through the
+# trigrams and so also match in the middle of words
+MAX_PREFIX_LENGTH = 2
+
+
+class CommandIndex(object):
+    """
+    A search index over app commands, matching queries against the command
+    and app names through word prefixes and trigrams.
+
+    The index is updated incrementally: only the commands which were added,
+    removed or renamed since the last update are indexed again.
+    """
+
+    def __init__(self):
+        # (name, app name, lowered unicode search text) keyed by command name
+        self._documents = {}
+        # Command names keyed by word prefix and by trigram
+        self._prefixes = defaultdict(set)
+        self._trigrams = defaultdict(set)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def update(self, app_commands):
+        """
+        Updates the index to hold the given commands.
+
+        :param app_commands: The :class:`AppCommand` objects to index.
+        """
+        documents = dict(
+            (app_command.name, (app_command.name, app_command.app_name,
+                                _get_search_text(app_command)))
+            for app_command in app_commands
+        )
+        for name, document in self._documents.items():
+            if documents.get(name) != document:
+                self._remove(name, document)
+        for name, document in documents.items():
+            if name not in self._documents:
+                self._add(name, document)
+
+    def search(self, query, limit=20):
+        """
+        Returns the names of the commands matching the query, best first.
+
+        Every word of the query must match, either as the start of a word of
+        the command or app name, or anywhere in them for words of three or
+        more letters. Queries matching nothing that way fall back to fuzzy
+        matching, where the letters of the query must appear in order.
+        """
+        words = _to_unicode(query).lower().split()
+        if not words:
+            return sorted(self._documents)[:limit]
+
+        candidates = None
+        for word in words:
+            matches = self._match_word(word)
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                break
+
+        if candidates:
+            scored = [(self._score(name, words), name) for name in candidates]
+        else:
+            fuzzy = re.compile(".*?".join(re.escape(letter) for letter in "".join(words)))
+            scored = [
+                (len(match.group(0)), name)
+                for name, document in self._documents.items()
+                for match in [fuzzy.search(document[2])] if match
+            ]
+        return [name for _, name in sorted(scored)[:limit]]
+
+    def _match_word(self, word):
+        """
+        Returns the names of the commands matching a single query word.
+        """
+        if len(word) <= MAX_PREFIX_LENGTH:
+            return set(self._prefixes.get(word, ()))
+
+        candidates = None
+        for trigram in _get_trigrams(word):
+            matches = self._trigrams.get(trigram, set())
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return set()
+        # Trigrams can match out of order, check the whole word
+        return set(name for name in candidates if word in self._documents[name][2])
+
+    def _score(self, name, words):
+        """
+        Returns a sort key ranking word starts in the command name first.
+        """
+        text = self._documents[name][2]
+        name_words = _to_unicode(name).lower().split()
+        starts = sum(
+            1 for word in words
+            if not any(name_word.startswith(word) for name_word in name_words)
+        )
+        return (starts, text.find(words[0]), len(name))
+
+    def _add(self, name, document):
+        self._documents[name] = document
+        for prefix in _get_prefixes(document[2]):
+            self._prefixes[prefix].add(name)
+        for trigram in _get_trigrams(document[2]):
+            self._trigrams[trigram].add(name)
+
+    def _remove(self, name, document):
+        del self._documents[name]
+        for prefix in _get_prefixes(document[2]):
+            self._prefixes[prefix].discard(name)
+        for trigram in _get_trigrams(document[2]):
+            self._trigrams[trigram].discard(name)
+
+
+def _get_search_text(app_command):
+    """
+    Returns the lowered unicode text the command is searched by.
+    """
+    return (u"%s %s" % (_to_unicode(app_command.name), _to_unicode(app_command.app_name))).lower()
+
+
+def _to_unicode(text):
+    """
+    Returns text as unicode, decoding UTF-8 byte strings.
+    """
+    if isinstance(text, unicode):
+        return text
+    if isinstance(text, str):
+        return text.decode("utf-8", "replace")
+    # e.g. QString
+    return unicode(text)
+
+
+def _get_prefixes(text):
+    """
+    Returns the prefixes, up to MAX_PREFIX_LENGTH long, of the words of text.
+    """
+    return set(
+        word[:length]
+        for word in text.split()
+        for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1)
+    )
+
+
+def _get_trigrams(text):
+    """
+    Returns the trigrams of text.
+    """
+    return set(text[index:index + 3] for index in range(len(text) - 2))
+
+
+class CommandPalette(QtWidgets.QDialog):
+    """
+    A popup listing the commands matching what is typed in it.
+    """
+
+    def __init__(self, index, run_command, parent=None):
+        """
+        :param index: The :class:`CommandIndex` to search.
+        :param run_command: Called with the name of the command to run.
+        :param parent: The parent widget.
+        """
+        super(CommandPalette, self).__init__(parent, QtCore.Qt.Popup)
+        self._index = index
+        self._run_command = run_command
+        # The names of the commands listed, in order
+        self._results = []
+
+        self._line_edit = QtWidgets.QLineEdit(self)
+        self._line_edit.setPlaceholderText("Search Shotgun commands...")
+        self._list = QtWidgets.QListWidget(self)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(4, 4, 4, 4)
+        layout.addWidget(self._line_edit)
+        layout.addWidget(self._list)
+        self.resize(400, 300)
+
+        self._line_edit.textChanged.connect(self._search)
+        self._line_edit.returnPressed.connect(self._run_current)
+        self._list.itemActivated.connect(lambda item: self._run_item(item))
+
+    def popup(self):
+        """
+        Shows the palette, empty, under the mouse cursor.
+        """
+        self._line_edit.clear()
+        self._search("")
+        self.move(QtGui.QCursor.pos())
+        self.show()
+        self._line_edit.setFocus()
+
+    def keyPressEvent(self, event):
+        # Let the arrow keys move through the results while typing
+        if event.key() in (QtCore.Qt.Key_Up, QtCore.Qt.Key_Down):
+            row = self._list.currentRow() + (1 if event.key() == QtCore.Qt.Key_Down else -1)
+            self._list.setCurrentRow(max(0, min(row, self._list.count() - 1)))
+        else:
+            super(CommandPalette, self).keyPressEvent(event)
+
+    def _search(self, query):
+        # Typed text may not be ASCII, it's searched as unicode
+        self._results = self._index.search(query)
+        self._list.clear()
+        self._list.addItems([_to_unicode(name) for name in self._results])
+        self._list.setCurrentRow(0)
+
+    def _run_current(self):
+        item = self._list.currentItem()
+        if item is not None:
+            self._run_item(item)
+
+    def _run_item(self, item):
+        self.hide()
+        # The item text may not match the command name once converted
+        self._run_command(self._results[self._list.row(item)])
@@ -0,0 +1,228 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+import os
+import json
+import traceback
+
+from tank.platform import application
+
+
+# Command properties that can be stored in the command cache
+CACHED_PROPERTIES = ("type", "short_name", "title", "description", "icon", "hotkey")
+
+
+class DeferredAppLoader(object):
+    """
+    Defers the initialization of apps until one of their commands is run.
+
+    The commands an app registers are only known once it is initialized, so
+    they are cached on disk the first time an app initializes. In later
+    sessions, apps found in that cache with the same version are created but
+    not initialized: placeholder commands are registered from the cache
+    instead, and the app is initialized the first time one of them runs.
+
+    Apps which don't register any command, or which do more work once the
+    engine is started through post_engine_init, e.g. showing their UI at
+    startup, are never deferred.
+
+    Apps stay deferred when the engine changes context, unless they act on
+    context changes themselves.
+    """
+
+    def __init__(self, engine):
+        """
+        :param engine: The currently-starting engine.
+        :type engine: :class:`tank.platform.Engine`
+        """
+        self._engine = engine
+        self._cache_path = os.path.join(engine.cache_location, "deferred_app_commands.json")
+        self._cache = self._read_cache()
+        # (app, real init_app) of the apps not initialized yet, keyed by instance name
+        self._pending = {}
+        self._get_application = None
+
+    @property
+    def pending_apps(self):
+        """The instance names of the apps not initialized yet."""
+        return sorted(self._pending)
+
+    def install(self):
+        """
+        Starts deferring the init of the apps the engine loads.
+        """
+        self._get_application = application.get_application
+        application.get_application = self._deferring_get_application
+
+    def uninstall(self):
+        """
+        Stops deferring the init of the apps the engine loads.
+        """
+        if self._get_application:
+            application.get_application = self._get_application
+            self._get_application = None
+
+    def _deferring_get_application(self, *args, **kwargs):
+        """
+        Wraps get_application to defer or record the init of each app.
+        """
+        app = self._get_application(*args, **kwargs)
+        init_app = app.init_app
+        cached = self._cache.get(app.instance_name)
+        if (cached and cached["version"] == app.version and cached["commands"]
+                and not _overrides(app, "post_engine_init")):
+            self._pending[app.instance_name] = (app, init_app)
+            app.init_app = lambda: None
+        else:
+            app.init_app = lambda: self._init_and_record(app, init_app)
+        return app
+
+    def _init_and_record(self, app, init_app):
+        """
+        Initializes an app and caches the commands it registered.
+        """
+        known_commands = set(self._engine.commands)
+        init_app()
+
+        commands = []
+        for name, command in self._engine.commands.items():
+            if name in known_commands:
+                continue
+            # Commands registered outside of the engine start-up are not
+            # attached to their app by Toolkit
+            command["properties"].setdefault("app", app)
+            properties = dict(
+                (key, value) for key, value in command["properties"].items()
+                if key in CACHED_PROPERTIES
+            )
+            commands.append({"name": name, "properties": properties})
+
+        self._cache[app.instance_name] = {"version": app.version, "commands": commands}
+        self._write_cache()
+
+    def register_placeholder_commands(self):
+        """
+        Registers the cached commands of the apps not initialized yet.
+        """
+        for instance_name, (app, _) in self._pending.items():
+            for command in self._cache[instance_name]["commands"]:
+                name = command["name"]
+                callback = lambda i=instance_name, n=name: self.run_command(i, n)
+                self._engine.register_command(name, callback, dict(command["properties"]))
+                self._engine.commands[name]["properties"]["app"] = app
+                self._engine.commands[name]["properties"]["deferred"] = True
+
+    def prepare_context_change(self):
+        """
+        Initializes the apps not initialized yet which act on context changes,
+        as Toolkit calls their pre_context_change and post_context_change
+        whether they were initialized or not.
+        """
+        for instance_name, (app, _) in self._pending.items():
+            if _overrides(app, "pre_context_change") or _overrides(app, "post_context_change"):
+                self.ensure_initialized(instance_name)
+
+    def follow_context_change(self):
+        """
+        Keeps the apps not initialized yet deferred once the engine changed
+        context: the apps Toolkit did not reuse are forgotten, and the
+        placeholder commands of the others registered again.
+        """
+        for instance_name, (app, _) in self._pending.items():
+            if self._engine.apps.get(instance_name) is not app:
+                del self._pending[instance_name]
+
+        # Toolkit may register again the placeholders of apps initialized since
+        pending_apps = [app for app, _ in self._pending.values()]
+        for name, command in self._engine.commands.items():
+            properties = command["properties"]
+            if properties.get("deferred") and properties.get("app") not in pending_apps:
+                del self._engine.commands[name]
+        self.register_placeholder_commands()
+
+    def ensure_initialized(self, instance_name):
+        """
+        Initializes the given app if it has not been initialized yet.
+
+        :returns: Whether the app was initialized by this call.
+        """
+        pending = self._pending.pop(instance_name, None)
+        if pending is None:
+            return False
+
+        app, init_app = pending
+        for name, command in self._engine.commands.items():
+            if command["properties"].get("deferred") and command["properties"].get("app") is app:
+                del self._engine.commands[name]
+
+        self._engine.log_debug("Initializing deferred app %s..." % instance_name)
+        self._init_and_record(app, init_app)
+        return True
+
+    def run_command(self, instance_name, name):
+        """
+        Initializes the given app and runs its real command.
+        """
+        self.ensure_initialized(instance_name)
+        self._engine.rebuild_katana_menu()
+
+        command = self._engine.commands.get(name)
+        if command is None:
+            self._engine.log_error("App %s no longer provides the command %s." % (instance_name, name))
+            return
+        command["callback"]()
+
+    def start_prewarm(self, delay=5000):
+        """
+        Initializes the remaining apps one at a time from the Qt event loop,
+        starting after the given delay in milliseconds.
+        """
+        from Katana import QtCore
+
+        def prewarm_next():
+            if not self._pending:
+                return
+            try:
+                self.ensure_initialized(self.pending_apps[0])
+            except Exception:
+                traceback.print_exc()
+            if self._pending:
+                QtCore.QTimer.singleShot(0, prewarm_next)
+            else:
+                self._engine.rebuild_katana_menu()
+
+        QtCore.QTimer.singleShot(delay, prewarm_next)
+
+    def _read_cache(self):
+        """
+        Reads the cached commands, keyed by app instance name.
+        """
+        try:
+            with open(self._cache_path) as cache_file:
+                return json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_cache(self):
+        """
+        Writes the cached commands.
+        """
+        try:
+            with open(self._cache_path, "w") as cache_file:
+                json.dump(self._cache, cache_file, indent=2)
+        except (IOError, OSError), e:
+            self._engine.log_warning("Could not write app command cache %s: %s" % (self._cache_path, e))
+
+
+def _overrides(app, name):
+    """
+    Returns whether the app does anything in the named Application method,
+    e.g. post_engine_init, which Toolkit calls even if the app was not
+    initialized.
+    """
+    method = getattr(type(app), name, None)
+    base_method = getattr(application.Application, name, None)
+    if method is None or base_method is None:
+        return False
+    return getattr(method, "__func__", method) is not getattr(base_method, "__func__", base_method)
@@ -0,0 +1,139 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+from collections import defaultdict
+import os
+import Queue
+import threading
+
+try:
+
+    from Katana import QtGui, QtCore ,QtWidgets
+
+except:
+
+    from Katana import QtGui, QtCore
+    QtWidgets = QtGui
+
+
+class IconCache(object):
+    """
+    A process-wide cache of the icons of menu actions.
+
+    Icon files may live on slow network mounts, so they are never read from
+    the main thread: a worker thread checks their modification time and
+    decodes them, and actions show a blank placeholder until their icon is
+    ready. Icons are cached by path and modification time, and survive menu
+    rebuilds.
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """
+        Returns the icon cache shared by every menu.
+        """
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        # (modification time, QIcon) keyed by path
+        self._icons = {}
+        # Actions waiting for their icon, keyed by path
+        self._waiting = defaultdict(list)
+        # Paths queued for the worker thread
+        self._queued = set()
+        self._requests = Queue.Queue()
+        self._results = Queue.Queue()
+        self._worker = None
+        self._timer = None
+        self._placeholder = None
+
+    def set_action_icon(self, action, path):
+        """
+        Sets the icon of a QAction from the given file, using the cached icon
+        or a placeholder until the file has been decoded.
+        """
+        cached = self._icons.get(path)
+        action.setIcon(cached[1] if cached else self._get_placeholder())
+        # Updated once the file has been checked, in case it changed
+        self._waiting[path].append(action)
+
+        # The cached icon is checked against the file in the background
+        if path not in self._queued:
+            self._queued.add(path)
+            self._requests.put((path, cached[0] if cached else None))
+            self._start()
+
+    def _get_placeholder(self):
+        """
+        Returns a blank icon the size of a menu icon.
+        """
+        if self._placeholder is None:
+            pixmap = QtGui.QPixmap(16, 16)
+            pixmap.fill(QtCore.Qt.transparent)
+            self._placeholder = QtGui.QIcon(pixmap)
+        return self._placeholder
+
+    def _start(self):
+        """
+        Starts the worker thread and the main thread timer collecting its
+        results, if not running.
+        """
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._decode_icons, name="tk-katana icons")
+            self._worker.daemon = True
+            self._worker.start()
+
+        if self._timer is None:
+            self._timer = QtCore.QTimer()
+            self._timer.setInterval(50)
+            self._timer.timeout.connect(self._apply_icons)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def _decode_icons(self):
+        """
+        Worker thread loop decoding the icon files which are new or changed.
+        """
+        while True:
+            path, cached_mtime = self._requests.get()
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                mtime = None
+            image = None
+            if mtime is not None and mtime != cached_mtime:
+                # Unlike pixmaps, images can be loaded outside the main thread
+                image = QtGui.QImage(path)
+            self._results.put((path, mtime, image))
+
+    def _apply_icons(self):
+        """
+        Polled on the main thread: caches the decoded icons and sets them on
+        the actions waiting for them.
+        """
+        while True:
+            try:
+                path, mtime, image = self._results.get_nowait()
+            except Queue.Empty:
+                break
+
+            self._queued.discard(path)
+            if image is not None and not image.isNull():
+                icon = QtGui.QIcon(QtGui.QPixmap.fromImage(image))
+                self._icons[path] = (mtime, icon)
+
+            cached = self._icons.get(path)
+            for action in self._waiting.pop(path, []):
+                try:
+                    action.setIcon(cached[1] if cached else QtGui.QIcon())
+                except RuntimeError:
+                    # The action was deleted along with its menu
+                    pass
+
+        if not self._queued:
+            self._timer.stop()
@@ -18,6 +18,10 @@ except:
     from Katana import QtGui, QtCore
     QtWidgets = QtGui
 
+from .command_palette import CommandIndex, CommandPalette
+from .icons import IconCache
+
+
 class MenuGenerator(object):
     """
     A Katana specific menu generator.
@@ -33,26 +37,177 @@ class MenuGenerator(object):
         """
         self._engine = engine
         self._menu_name = menu_name
-        self._app_commands = self.get_all_app_commands()
+        self._app_commands = []
+        # The commands by name, looked up when their action is triggered so
+        # that actions kept across updates run the current callbacks
+        self._commands_by_name = {}
+        # (signature, QAction) of each entry of the root menu, keyed by entry key
+        self._entries = {}
+        self._context_menu = None
+        # Search index of the commands for the command palette
+        self._command_index = CommandIndex()
+        self._command_palette = None
         self.root_menu = self.setup_root_menu()
+        self.update()
+
+    def update(self, engine=None):
+        """
+        Updates the menu to match the commands of the engine, e.g. after a
+        context change. Only the entries which changed are added, removed or
+        replaced, the others are kept as they are.
 
-        # now add the context item on top of the main menu
-        self._context_menu = self._add_context_menu()
-        self.root_menu.addSeparator()
+        :param engine: (optional) The engine to take the commands from, if
+            it is not the one the menu was created for.
+        """
+        if engine is not None:
+            self._engine = engine
+        if self.root_menu is None:
+            return
+
+        self._app_commands = self.get_all_app_commands()
+        self._commands_by_name = dict(
+            (app_command.name, app_command) for app_command in self._app_commands
+        )
+        self._command_index.update(self._app_commands)
 
+        favourites = []
+        context_commands = []
         apps_commands = defaultdict(list)
         for app_command in self._app_commands:
             if app_command.favourite:
-                app_command.add_command_to_menu(self.root_menu)
+                favourites.append(app_command)
 
             if app_command.type == "context_menu":
-                app_command.add_command_to_menu(self._context_menu)
+                context_commands.append(app_command)
             else:
                 app_name = app_command.app_name
                 apps_commands[app_name].append(app_command)
-        self.root_menu.addSeparator()
 
-        self._add_app_menu(apps_commands)
+        # the context item on top of the main menu, then the favourites,
+        # then the apps
+        entries = [(
+            ("context",),
+            self._get_signature(context_commands),
+            lambda: self._add_context_menu(context_commands),
+        )]
+        palette_hotkey = self.engine.get_setting("command_palette_hotkey", "")
+        entries.append((
+            ("palette",),
+            palette_hotkey,
+            lambda: self._add_palette_action(palette_hotkey),
+        ))
+        entries.append((("separator", 0), None, self._add_separator))
+        for app_command in favourites:
+            entries.append(self._get_command_entry("favourite", app_command))
+        entries.append((("separator", 1), None, self._add_separator))
+        entries.extend(self._get_app_menu_entries(apps_commands))
+
+        self._update_entries(entries)
+        self._context_menu.setTitle(str(self.engine.context))
+
+    def _update_entries(self, entries):
+        """
+        Brings the root menu in line with the given (key, signature, builder)
+        entries, reusing the actions of the unchanged entries.
+        """
+        old_entries = self._entries
+        self._entries = {}
+        actions = []
+        for key, signature, build in entries:
+            entry = old_entries.pop(key, None)
+            if entry is None or entry[0] != signature:
+                if entry is not None:
+                    self._remove_action(entry[1])
+                entry = (signature, build())
+            self._entries[key] = entry
+            actions.append(entry[1])
+
+        for _, action in old_entries.values():
+            self._remove_action(action)
+
+        # put the actions in order, only moving the ones out of place
+        for index, action in enumerate(actions):
+            menu_actions = self.root_menu.actions()
+            if index < len(menu_actions) and menu_actions[index] is action:
+                continue
+            before = menu_actions[index] if index < len(menu_actions) else None
+            self.root_menu.insertAction(before, action)
+
+        # anything after our entries was not added by this generator
+        for action in self.root_menu.actions()[len(actions):]:
+            self.root_menu.removeAction(action)
+
+    def _remove_action(self, action):
+        """
+        Removes an action, and its sub menu if any, from the root menu and
+        deletes it.
+        """
+        self.root_menu.removeAction(action)
+        sub_menu = action.menu()
+        if sub_menu is not None:
+            sub_menu.deleteLater()
+        action.deleteLater()
+
+    def _add_palette_action(self, hotkey):
+        """
+        Creates the action showing the command palette.
+        """
+        action = QtWidgets.QAction("Search Commands...", self.root_menu)
+        if hotkey:
+            action.setShortcut(QtGui.QKeySequence(hotkey))
+            action.setShortcutContext(QtCore.Qt.ApplicationShortcut)
+        action.triggered.connect(lambda: self.show_command_palette())
+        return action
+
+    def show_command_palette(self):
+        """
+        Shows a popup to search and run the commands of the menu.
+        """
+        if self._command_palette is None:
+            self._command_palette = CommandPalette(
+                self._command_index,
+                lambda name: self._commands_by_name[name].callback(),
+            )
+        self._command_palette.popup()
+
+    def _add_separator(self):
+        """
+        Creates a separator action for the root menu.
+        """
+        action = QtWidgets.QAction(self.root_menu)
+        action.setSeparator(True)
+        return action
+
+    def _get_signature(self, app_commands):
+        """
+        Returns what the menu shows of the given commands, to detect changes.
+        """
+        return tuple(
+            (
+                app_command.name,
+                app_command.type,
+                app_command.app_name,
+                app_command.favourite,
+                app_command.properties.get("hotkey"),
+                app_command.properties.get("icon"),
+            )
+            for app_command in app_commands
+        )
+
+    def _get_command_entry(self, kind, app_command):
+        """
+        Returns the root menu entry of a single command.
+        """
+        def build():
+            return app_command.create_action(
+                self.root_menu, self._get_command_callback(app_command.name))
+        return (kind, app_command.name), self._get_signature([app_command]), build
+
+    def _get_command_callback(self, name):
+        """
+        Returns a callback running the current command of the given name.
+        """
+        return lambda: self._commands_by_name[name].callback()
 
     @property
     def engine(self):
@@ -66,13 +221,20 @@ class MenuGenerator(object):
 
     def get_all_app_commands(self):
         commands = []
-        favourites = self.engine.get_setting("menu_favourites", default=[])
+        favourites = set(
+            (item["app_instance"], item["name"])
+            for item in self.engine.get_setting("menu_favourites", default=[])
+        )
+        app_instance_names = dict(
+            (app, app_instance_name)
+            for app_instance_name, app in self.engine.apps.items()
+        )
 
         for cmd_name, cmd_details in sorted(self.engine.commands.items()):
-            app_command = AppCommand(self.engine, cmd_name, cmd_details)
-            app_command.favourite = any(
-                app_command == item
-                for item in favourites
+            app_command = AppCommand(self.engine, cmd_name, cmd_details,
+                                     app_instance_names)
+            app_command.favourite = (
+                (app_command.app_instance_name, app_command.name) in favourites
             )
             commands.append(app_command)
         return commands
@@ -91,14 +253,32 @@ class MenuGenerator(object):
             self.engine.log_debug(message)
             return
 
+        return self.get_or_create_root_menu(self.menu_name, main_menu)
+
+    @classmethod
+    def get_or_create_root_menu(cls, menu_name, main_menu=None):
+        """
+        Finds the menu of the given title in Katana's main menu bar, or
+        creates it if it can't be found.
+
+        :param menu_name: The title of the menu.
+        :param main_menu: The main menu bar, looked up if not given.
+        :returns: The menu, or None if the main menu bar is not available.
+        """
+        if main_menu is None:
+            try:
+                main_menu = cls.get_katana_main_bar()
+            except Exception:
+                return None
+
         # Attempt to find existing menu
         for menu in main_menu.children():
             is_menu = isinstance(menu, QtWidgets.QMenu)
-            if is_menu and menu.title() == self.menu_name:
+            if is_menu and menu.title() == menu_name:
                 return menu
 
         # Otherwise, create a new menu
-        menu = QtWidgets.QMenu(self.menu_name, main_menu)
+        menu = QtWidgets.QMenu(menu_name, main_menu)
         main_menu.addMenu(menu)
         return menu
 
@@ -118,17 +298,21 @@ class MenuGenerator(object):
         """
         if self.root_menu is not None:
             self.root_menu.clear()
+        self._entries = {}
+        self._context_menu = None
 
     ###########################################################################
     # context menu and UI
 
-    def _add_context_menu(self):
+    def _add_context_menu(self, context_commands):
         """
-        Adds a context menu which displays the current context.
+        Creates a context menu which displays the current context.
+
+        :returns: The action of the menu, to add to the root menu.
         """
         # create the context menu
         ctx = self.engine.context
-        menu = self.root_menu.addMenu(str(ctx))
+        menu = QtWidgets.QMenu(str(ctx), self.root_menu)
         action_items = (
             ('Jump to File System', self._jump_to_fs),
             #('Jump to Shotgun', self._jump_to_sg),
@@ -138,7 +322,13 @@ class MenuGenerator(object):
 
         menu.addAction("Jump to Shotgun").triggered.connect(lambda: self._jump_to_sg())
         menu.addSeparator()
-        return menu
+
+        for app_command in context_commands:
+            app_command.add_command_to_menu(
+                menu, self._get_command_callback(app_command.name))
+
+        self._context_menu = menu
+        return menu.menuAction()
 
     def _jump_to_sg(self):
         """
@@ -177,25 +367,59 @@ class MenuGenerator(object):
     ###########################################################################
     # app menus
 
-    def _add_app_menu(self, commands_by_app):
+    def _get_app_menu_entries(self, commands_by_app):
         """
-        Add all apps to the main menu, process them one by one.
+        Returns the root menu entries of all apps, process them one by one.
         """
+        entries = []
         for app_name, commands in sorted(commands_by_app.items()):
             if len(commands) == 1:
                 # Single entry, display on root menu
                 # todo: Should this be labelled with the name of the app
                 # or the name of the menu item? Not sure.
-                app_menu = self.root_menu
                 # Skip if favourite (since it is already on the menu)
-                commands = [] if commands[0].favourite else commands
+                if not commands[0].favourite:
+                    entries.append(self._get_command_entry("command", commands[0]))
             else:
                 # More than one menu entry for this app
                 # make a sub menu and put all items in the sub menu
-                app_menu = self.root_menu.addMenu(app_name)
+                build = lambda n=app_name, c=commands: self._add_app_menu(n, c)
+                entries.append((("app", app_name), self._get_signature(commands), build))
+        return entries
+
+    def _add_app_menu(self, app_name, commands):
+        """
+        Creates the sub menu of an app.
 
-            for app_command in commands:
-                app_command.add_command_to_menu(app_menu)
+        :returns: The action of the menu, to add to the root menu.
+        """
+        app_menu = QtWidgets.QMenu(app_name, self.root_menu)
+        if any(cmd.properties.get("hotkey") for cmd in commands):
+            # Hotkeys need their action to exist, so sub menus holding any
+            # are filled right away.
+            self._populate(app_menu, commands)
+        else:
+            # Only build the actions once the sub menu is opened.
+            self._populate_on_show(app_menu, commands)
+        return app_menu.menuAction()
+
+    def _populate(self, menu, app_commands):
+        """
+        Fills the given menu with its commands.
+        """
+        for app_command in app_commands:
+            app_command.add_command_to_menu(
+                menu, self._get_command_callback(app_command.name))
+
+    def _populate_on_show(self, menu, app_commands):
+        """
+        Fills the given menu with its commands the first time it is shown.
+        """
+        def populate():
+            menu.aboutToShow.disconnect(populate)
+            self._populate(menu, app_commands)
+
+        menu.aboutToShow.connect(populate)
 
 
 class AppCommand(object):
@@ -203,7 +427,12 @@ class AppCommand(object):
     Wraps around a single command that you get from engine.commands
     """
 
-    def __init__(self, engine, name, command_dict):
+    __slots__ = (
+        "_name", "_engine", "_properties", "_callback", "_favourite",
+        "_type", "_app", "_app_name", "_app_instance_name",
+    )
+
+    def __init__(self, engine, name, command_dict, app_instance_names=None):
         """Create a named wrapped command using given engine and information.
 
         :param engine: The currently-running engine.
@@ -212,6 +441,9 @@ class AppCommand(object):
         :type name: str
         :param command_dict: Command's information, e.g. properties, callback.
         :type command_dict: dict[str]
+        :param app_instance_names: (optional) Instance names keyed by app,
+            looked up in ``engine.apps`` if not given.
+        :type app_instance_names: dict
         """
         self._name = name
         self._engine = engine
@@ -230,10 +462,13 @@ class AppCommand(object):
             except AttributeError:
                 pass
 
-            for app_instance_name, app_instance_obj in engine.apps.items():
-                if self._app == app_instance_obj:
-                    self._app_instance_name = app_instance_name
-                    break
+            if app_instance_names is not None:
+                self._app_instance_name = app_instance_names.get(self._app)
+            else:
+                for app_instance_name, app_instance_obj in engine.apps.items():
+                    if self._app == app_instance_obj:
+                        self._app_instance_name = app_instance_name
+                        break
 
     def __eq__(self, other):
         """Check if our app command matches a given dictionary of attributes.
@@ -356,11 +591,26 @@ class AppCommand(object):
         finally:
             delattr(tank, "_callback_from_non_pane_menu")
 
-    def add_command_to_menu(self, menu):
+    def add_command_to_menu(self, menu, callback=None):
         """
         Add a new QAction representing this AppCommand to a given QMenu.
+
+        :param callback: (optional) What the action runs instead of the
+            command's own callback.
+        """
+        action = self.create_action(menu, callback)
+        menu.addAction(action)
+        return action
+
+    def create_action(self, parent, callback=None):
+        """
+        Create a new QAction representing this AppCommand.
+
+        :param parent: The parent of the action.
+        :param callback: (optional) What the action runs instead of the
+            command's own callback.
         """
-        action = menu.addAction(self.name)
+        action = QtWidgets.QAction(self.name, parent)
 
         key_sequence = self.properties.get("hotkey")
         if key_sequence:
@@ -368,10 +618,9 @@ class AppCommand(object):
 
         icon_path = self.properties.get("icon")
         if icon_path:
-            icon = QtGui.QIcon(icon_path)
-            if not icon.isNull():
-                action.setIcon(icon)
+            IconCache.instance().set_action_icon(action, icon_path)
 
         # Wrap to avoid passing args
-        action.triggered.connect(lambda: self.callback())
+        callback = callback or self.callback
+        action.triggered.connect(lambda: callback())
         return action
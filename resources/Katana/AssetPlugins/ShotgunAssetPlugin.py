@@ -1,18 +1,509 @@
 # Copyright (c) 2015 The Foundry Visionmongers Ltd. All Rights Reserved.
 
-from time import gmtime, strftime
+from collections import defaultdict, deque, namedtuple
+from time import gmtime, strftime, time
+from timeit import default_timer
+import ast
+import atexit
+import functools
+import heapq
+import inspect
+import json
+import math
+import mmap
 import os
+import re
 import sys
 import getpass
 import logging
+import threading
 import AssetAPI
 
-# Shotgun - This should already be in the PYTHONPATH due to the init script.
-import tank
+# Set-up plug-in logger
+log = logging.getLogger('ShotgunAssetPlugin')
 
+# The context registry shared with the init script lives next to the plug-ins
+_registryPath = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python")
+if _registryPath not in sys.path:
+    sys.path.append(_registryPath)
 
-# Set-up plug-in logger
-#log = logging.getLogger('ShotgunAssetPlugin') # TODO
+# Maximum number of parsed asset IDs kept in memory by the plug-in
+ASSET_ID_CACHE_SIZE = 10000
+
+# Maximum number of resolved paths kept in memory by the plug-in
+RESOLVE_CACHE_SIZE = 10000
+
+# Maximum number of FileSequence objects kept in memory by the plug-in
+FILE_SEQUENCE_CACHE_SIZE = 1000
+
+# Number of seconds a resolved path is trusted for, 0 keeps it until reset()
+RESOLVE_CACHE_TTL = float(os.environ.get("SHOTGUN_ASSET_RESOLVE_CACHE_TTL") or 0)
+
+# When set, cached paths are dropped as soon as their publish directory changes
+RESOLVE_CACHE_CHECK_MTIME = bool(os.environ.get("SHOTGUN_ASSET_RESOLVE_CACHE_CHECK_MTIME"))
+
+# Template key holding the version of a publish
+VERSION_KEY = "version"
+
+# Version tag resolving to the highest version published on disk
+LATEST_VERSION_TAG = "latest"
+
+# Path of a pre-resolved asset manifest to answer lookups from, see AssetManifest
+MANIFEST_ENV_VAR = "SHOTGUN_ASSET_MANIFEST"
+
+# Extension of the asset manifest written next to a Katana scene
+MANIFEST_EXTENSION = ".sgassets"
+
+# When set, the plug-in times its public methods and dumps the statistics as
+# JSON when the process exits: to stderr if set to "1", else to the file named
+STATS_ENV_VAR = "SHOTGUN_ASSET_PLUGIN_STATS"
+
+# Number of slowest asset IDs reported in the statistics
+STATS_SLOWEST_COUNT = 20
+
+# Whitespace separated tokens of a string that may hold asset IDs
+_TOKEN_RE = re.compile(r"\S+")
+
+# Marker for cache misses, as None is a valid cached value
+_MISSING = object()
+
+
+class AssetId(namedtuple("AssetId", ["template", "fields"])):
+    """
+    Immutable, parsed form of a Shotgun asset ID.
+
+    The fields are stored as a sorted tuple of (key, value) pairs so that the
+    record is hashable and can be used as a cache key.
+    """
+    __slots__ = ()
+
+    def getFields(self):
+        """
+        Returns a new dict of the fields of this asset ID
+        """
+        return dict(self.fields)
+
+
+class LRUCache(object):
+    """
+    A bounded mapping that discards the least recently used entries once it
+    holds more than maxSize items.
+
+    Recency is tracked with the CLOCK approximation: a hit only flags its
+    entry, and entries flagged since they were last looked at get a second
+    chance on eviction. That way lookups never take a lock and are safe to run
+    from any thread, while insertions are serialized.
+    """
+    def __init__(self, maxSize):
+        self._maxSize = maxSize
+        # [value, referenced] lists keyed by cache key
+        self._data = {}
+        # Keys in eviction order
+        self._order = deque()
+        self._lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self._data)
+
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for key, marking it as recently used
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        entry[1] = True
+        return entry[0]
+
+
+    def set(self, key, value):
+        """
+        Stores value for key, evicting the oldest entry if the cache is full
+        """
+        with self._lock:
+            if key not in self._data:
+                self._order.append(key)
+            self._data[key] = [value, False]
+            while len(self._data) > self._maxSize:
+                oldKey = self._order.popleft()
+                entry = self._data[oldKey]
+                if entry[1]:
+                    entry[1] = False
+                    self._order.append(oldKey)
+                else:
+                    del self._data[oldKey]
+
+
+    def clear(self):
+        """
+        Removes every entry from the cache
+        """
+        with self._lock:
+            self._data = {}
+            self._order.clear()
+
+
+class SingleFlight(object):
+    """
+    Runs at most one call per key at a time. Threads asking for a key that is
+    already being computed wait for that result instead of computing it again.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Calls in progress, keyed by key
+        self._calls = {}
+
+
+    def do(self, key, function, *args):
+        """
+        Returns function(*args), sharing the call with other threads running
+        it for the same key. Exceptions are raised in every waiting thread.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            isLeader = call is None
+            if isLeader:
+                call = self._calls[key] = _FlightCall()
+
+        if not isLeader:
+            call.done.wait()
+            if call.error:
+                raise call.error[0], call.error[1], call.error[2]
+            return call.result
+
+        try:
+            call.result = function(*args)
+        except:
+            call.error = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class _FlightCall(object):
+    """
+    The state of a call shared through SingleFlight
+    """
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResolveCache(object):
+    """
+    Caches resolved file paths keyed on parsed asset IDs, that is on the
+    template name and the normalized fields.
+
+    Entries expire after ttl seconds when ttl is non-zero and, if checkMtime
+    is set, as soon as the modification time of the directory holding the
+    resolved path changes. Hits and misses are counted for diagnostics; the
+    counts are not locked, so they may be slightly off under concurrent use.
+    """
+    def __init__(self, maxSize, ttl=0, checkMtime=False):
+        self._entries = LRUCache(maxSize)
+        self.ttl = ttl
+        self.checkMtime = checkMtime
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key, default=None):
+        """
+        Returns the path cached for key if it is still valid
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            path, timestamp, mtime = entry
+            expired = self.ttl and time() - timestamp > self.ttl
+            if not expired and (not self.checkMtime or getDirectoryMtime(path) == mtime):
+                self.hits += 1
+                return path
+        self.misses += 1
+        return default
+
+
+    def set(self, key, path):
+        """
+        Caches the path resolved for key
+        """
+        mtime = getDirectoryMtime(path) if self.checkMtime else None
+        self._entries.set(key, (path, time(), mtime))
+
+
+    def clear(self):
+        """
+        Flushes every cached path. Counters are kept.
+        """
+        self._entries.clear()
+
+
+    def stats(self):
+        """
+        Returns a dict with the hit and miss counts and the number of cached paths
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class AssetManifest(object):
+    """
+    Read-only view of a pre-resolved asset manifest.
+
+    A manifest is a text file with a header line followed by one
+    "<key>\\t<path>" line per asset ID, sorted by key, where the key comes
+    from getManifestKey. It is memory-mapped and searched in place, so
+    opening a manifest costs the same whatever its size.
+    """
+    HEADER = "# ShotgunAssetPlugin manifest 1\n"
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as manifestFile:
+            self._data = mmap.mmap(manifestFile.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:len(self.HEADER)] != self.HEADER:
+            self._data.close()
+            raise ValueError("%s is not an asset manifest" % path)
+
+
+    def get(self, key, default=None):
+        """
+        Returns the path stored for key, using a binary search over the lines
+        """
+        data = self._data
+        lo = len(self.HEADER)
+        hi = len(data)
+        while lo < hi:
+            # lo and hi are always at the start of a line
+            mid = (lo + hi) // 2
+            start = data.rfind("\n", lo, mid)
+            start = lo if start < 0 else start + 1
+            end = data.find("\n", start)
+            lineKey, _, path = data[start:end].partition("\t")
+            if lineKey == key:
+                return path
+            elif lineKey < key:
+                lo = end + 1
+            else:
+                hi = start
+        return default
+
+
+    def close(self):
+        self._data.close()
+
+
+    @classmethod
+    def write(cls, path, paths):
+        """
+        Writes a manifest to path from a dict of resolved paths keyed by
+        manifest key
+        """
+        lines = ["%s\t%s\n" % (key, assetPath)
+                 for key, assetPath in sorted(paths.items())
+                 if "\n" not in assetPath]
+        tempPath = "%s.%d.tmp" % (path, os.getpid())
+        with open(tempPath, "wb") as manifestFile:
+            manifestFile.write(cls.HEADER)
+            manifestFile.writelines(lines)
+        # Never leave a half written manifest for render nodes to find
+        os.rename(tempPath, path)
+
+
+class PluginStats(object):
+    """
+    Collects call counts and latencies of the plug-in methods.
+
+    Latencies are counted in logarithmic buckets about 5% wide, so memory use
+    doesn't grow with the number of calls and percentiles are approximate.
+    """
+    BUCKETS_PER_E = 20
+
+    def __init__(self, slowestCount=STATS_SLOWEST_COUNT):
+        self._lock = threading.Lock()
+        self._slowestCount = slowestCount
+        # {method name: [calls, total seconds, {bucket: calls}]}
+        self._methods = defaultdict(lambda: [0, 0.0, defaultdict(int)])
+        # Heap of the (seconds, method name, asset ID) of the slowest calls
+        self._slowest = []
+
+
+    def record(self, name, seconds, assetId=None):
+        """
+        Records a call to the named method
+        """
+        bucket = int(math.floor(math.log(max(seconds, 1e-9)) * self.BUCKETS_PER_E))
+        with self._lock:
+            method = self._methods[name]
+            method[0] += 1
+            method[1] += seconds
+            method[2][bucket] += 1
+            if assetId is not None:
+                item = (seconds, name, assetId)
+                if len(self._slowest) < self._slowestCount:
+                    heapq.heappush(self._slowest, item)
+                elif item > self._slowest[0]:
+                    heapq.heapreplace(self._slowest, item)
+
+
+    def report(self):
+        """
+        Returns the statistics as a dict, with times in milliseconds
+        """
+        with self._lock:
+            methods = {}
+            for name, (calls, total, buckets) in self._methods.items():
+                methods[name] = {
+                    "calls": calls,
+                    "total_ms": total * 1000.0,
+                    "p50_ms": self._percentile(calls, buckets, 0.5) * 1000.0,
+                    "p99_ms": self._percentile(calls, buckets, 0.99) * 1000.0,
+                }
+            slowest = [{"method": name, "asset_id": assetId, "ms": seconds * 1000.0}
+                       for seconds, name, assetId in sorted(self._slowest, reverse=True)]
+        return {"methods": methods, "slowest": slowest}
+
+
+    def _percentile(self, calls, buckets, fraction):
+        '''
+        Returns the upper bound in seconds of the bucket holding the given
+        fraction of the calls
+        '''
+        threshold = calls * fraction
+        seen = 0
+        for bucket in sorted(buckets):
+            seen += buckets[bucket]
+            if seen >= threshold:
+                return math.exp(float(bucket + 1) / self.BUCKETS_PER_E)
+        return 0.0
+
+
+# Statistics of the plug-in methods, None unless enabled through STATS_ENV_VAR
+_stats = PluginStats() if os.environ.get(STATS_ENV_VAR) else None
+
+
+def instrumented(method):
+    """
+    Decorates a plug-in method so that its calls are timed when statistics are
+    enabled. When they are not, the method is returned untouched.
+
+    The slowest calls of the methods taking an assetId first argument are
+    recorded with their asset ID.
+    """
+    if _stats is None:
+        return method
+
+    name = method.__name__
+    takesAssetId = inspect.getargspec(method).args[1:2] == ["assetId"]
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = default_timer()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            assetId = None
+            if takesAssetId and args and isinstance(args[0], basestring):
+                assetId = args[0][:256]
+            _stats.record(name, default_timer() - start, assetId)
+    return wrapper
+
+
+def getManifestKey(parsedId):
+    """
+    Returns the key used to store the given AssetId in an asset manifest
+    """
+    return repr(tuple(parsedId))
+
+
+def collectSceneAssetIds():
+    """
+    Returns the set of asset IDs used by the string parameters of every node
+    in the current Katana scene
+    """
+    import NodegraphAPI
+
+    assetIds = set()
+    parameters = [node.getParameters() for node in NodegraphAPI.GetAllNodes()]
+    while parameters:
+        parameter = parameters.pop()
+        if parameter is None:
+            continue
+        parameters.extend(parameter.getChildren() or [])
+        if parameter.getType() != "string":
+            continue
+        value = parameter.getValue(0)
+        if not value:
+            continue
+        # A parameter either holds an asset ID or, like command lines, a list
+        # of whitespace separated tokens that may be asset IDs
+        if parseAssetId(value):
+            assetIds.add(value)
+        else:
+            assetIds.update(token for token in _TOKEN_RE.findall(value)
+                            if parseAssetId(token))
+    return assetIds
+
+
+def getDirectoryMtime(path):
+    """
+    Returns the modification time of the directory holding path, or None if
+    it can't be read
+    """
+    try:
+        return os.path.getmtime(os.path.dirname(path))
+    except OSError:
+        return None
+
+
+def getStoredVersion(fieldDict):
+    """
+    Returns the version stored in the given asset ID fields, or None
+    """
+    # Early asset IDs stored the version as "Version"
+    return fieldDict.get(VERSION_KEY, fieldDict.get("Version"))
+
+
+def parseAssetId(string):
+    """
+    Parses the given string into an AssetId.
+
+    An asset ID is the repr of a dict holding a "template" name and a dict of
+    template "fields". Only Python literals are accepted. Returns None if the
+    string is not a valid asset ID.
+    """
+    if not isinstance(string, basestring):
+        string = str(string)
+    # Unicode strings are kept as is, they may not be ASCII
+    string = string.strip()
+    if not string.startswith("{"):
+        return None
+
+    try:
+        fullDict = ast.literal_eval(string)
+    except (ValueError, SyntaxError):
+        return None
+
+    if not isinstance(fullDict, dict):
+        return None
+    templateType = fullDict.get("template")
+    fieldDict = fullDict.get("fields")
+    if not isinstance(templateType, basestring) or not isinstance(fieldDict, dict):
+        return None
+
+    fields = tuple(sorted(fieldDict.items()))
+    try:
+        hash(fields)
+    except TypeError:
+        # Field values must be plain scalars
+        return None
+    return AssetId(templateType, fields)
 
 
 class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
@@ -22,22 +513,71 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
     implements all abstract functions from the plug-in interface. 
     """
     def __init__(self):
-        # Create a Tank instance
-        self.tk = None
-        self.setupTank()
+        # The Tank instance is only created when first needed, see the tk
+        # property, so that loading the plug-in never starts up Toolkit
+        self._tk = _MISSING
+        # Parsed asset IDs, keyed by the raw asset ID string
+        self._assetIdCache = LRUCache(ASSET_ID_CACHE_SIZE)
+        # Resolved file paths, keyed by parsed asset ID
+        self._resolveCache = ResolveCache(RESOLVE_CACHE_SIZE,
+                                          ttl=RESOLVE_CACHE_TTL,
+                                          checkMtime=RESOLVE_CACHE_CHECK_MTIME)
+        # FileSequence objects, or None for plain files, keyed by resolved path
+        self._fileSequenceCache = LRUCache(FILE_SEQUENCE_CACHE_SIZE)
+        # Pre-resolved asset manifest, loaded on first use
+        self._manifest = _MISSING
+        self._batchMode = None
+        # Katana may resolve assets from several threads. Cache hits never
+        # lock; misses for the same asset ID are resolved by a single thread
+        self._resolveFlight = SingleFlight()
+        # Versions published on disk, keyed by template name and the fields
+        # other than the version, filled as asset versions are resolved
+        self._versionIndex = {}
+        self._versionFlight = SingleFlight()
+        self._setupLock = threading.Lock()
+        if _stats is not None:
+            atexit.register(self.dumpStats)
+
+
+    @property
+    def tk(self):
+        """
+        The Tank instance used to resolve asset IDs, created on first access
+        """
+        if self._tk is _MISSING:
+            with self._setupLock:
+                if self._tk is _MISSING:
+                    self.setupTank()
+                    if self._tk is _MISSING:
+                        self._tk = None
+        return self._tk
+
+
+    @tk.setter
+    def tk(self, tk):
+        self._tk = tk
 
 
     def setupTank(self):
         '''
-        This function relies on the TANK_CONTEXT environment var being previously
-        set by Shotgun.
+        Reuses the context of the engine started by the init script if there is
+        one. Otherwise this function relies on the context Katana was launched
+        in, shared with the init script through the context registry.
         '''
+        # Shotgun - This should already be in the PYTHONPATH due to the init script.
+        import tank
+
         context = None
-        # Attempt to find context in environment
-        if "TANK_CONTEXT" in os.environ:
-            serialised_context = os.environ.get("TANK_CONTEXT")
-            if serialised_context:
-                context = tank.context.deserialize(serialised_context)
+        engine = tank.platform.current_engine()
+        if engine:
+            # The init script has already started the engine in the launch
+            # context, which may have changed since
+            context = engine.context
+        else:
+            # The registry keeps the context deserialized by the init script,
+            # or deserializes TANK_CONTEXT if it did not run
+            import tk_katana_context
+            context = tk_katana_context.get_launch_context()
         if context:
             self.tk = context.tank
 
@@ -46,46 +586,134 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         """
         Resets the state of the plug-in
         """
-        # Nothing to reset in this plug-in... If, for example, some caching was
-        # implemented then this would be the place to clear it.
-        pass
+        self._assetIdCache.clear()
+        self._resolveCache.clear()
+        self._fileSequenceCache.clear()
+        self._versionIndex = {}
+        # The manifest is left open for threads still reading it, it is
+        # closed once no longer referenced
+        self._manifest = _MISSING
+
+
+    def refreshVersionIndex(self):
+        """
+        Forgets the versions found on disk so far, so that "latest" versions
+        and partial asset IDs pick up new publishes
+        """
+        self._versionIndex = {}
+        # Paths resolved from partial asset IDs depend on the index
+        self._resolveCache.clear()
 
 
-    def isAssetId(self, string): # TODO
+    def getResolveCacheStats(self):
+        """
+        Returns the hit and miss counts of the resolved path cache
+        """
+        return self._resolveCache.stats()
+
+
+    def getStats(self):
+        """
+        Returns the method timings, collected when SHOTGUN_ASSET_PLUGIN_STATS
+        is set, and the cache hit rates as a dict
+        """
+        report = _stats.report() if _stats is not None else {}
+        report["resolve_cache"] = self.getResolveCacheStats()
+        return report
+
+
+    def dumpStats(self):
+        """
+        Writes the statistics as JSON to the destination named by
+        SHOTGUN_ASSET_PLUGIN_STATS
+        """
+        destination = os.environ.get(STATS_ENV_VAR)
+        if not destination:
+            return
+        report = json.dumps(self.getStats(), indent=2, sort_keys=True)
+        if destination == "1":
+            sys.stderr.write("ShotgunAssetPlugin statistics:\n%s\n" % report)
+        else:
+            with open(destination, "w") as statsFile:
+                statsFile.write(report)
+
+
+    @instrumented
+    def isAssetId(self, string):
         """
         Checks if the given string is a valid asset ID
         """
-        # This is a very simplistic test... but it conveys the idea of this function
-        fullDict = eval(str(string))
-        if fullDict.has_key("template") and fullDict.has_key("fields"):
+        if self.__parseAssetId(string):
             return True
         return None
 
 
+    @instrumented
     def resolveAsset(self, assetId, throwOnError=False):
         """
         Lookups the given asset ID in Shotgun and returns the file path that it references
         """
+        return self.__resolveAsset(assetId)
+
+
+    def __resolveAsset(self, assetId):
+        '''
+        Resolves an asset ID, without being timed so that the plug-in methods
+        resolving assets are only counted once in the statistics
+        '''
         if assetId == "":
             return None
 
-        if not self.isAssetId(assetId):
+        parsedId = self.__parseAssetId(assetId)
+        if not parsedId:
             # Return the assetId as it is if it is not recognized
             log.warning("resolveAsset: asset ID %s is not a valid asset. Skipping resolving asset." % assetId)
             return assetId
 
         # Get fields
-        idFieldDict = self.getAssetFields(assetId)
-        if not idFieldDict:
+        if not parsedId.fields:
             log.warning("resolveAsset: Resolving asset path from asset ID failed: %s" % assetId)
             return None
 
+        assetFilePath = self._resolveCache.get(parsedId, _MISSING)
+        if assetFilePath is _MISSING:
+            assetFilePath = self._resolveFlight.do(parsedId, self.__resolveUncached, parsedId)
+        return assetFilePath
+
+
+    def __resolveUncached(self, parsedId):
+        '''
+        Resolves the given AssetId from the manifest, or else from its template,
+        and caches the result
+        '''
+        assetFilePath = _MISSING
+        manifest = self.__getManifest()
+        if manifest:
+            assetFilePath = manifest.get(getManifestKey(parsedId), _MISSING)
+        if assetFilePath is _MISSING:
+            assetFilePath = self.__resolveFromTemplate(parsedId)
+        self._resolveCache.set(parsedId, assetFilePath)
+        return assetFilePath
+
+
+    def __resolveFromTemplate(self, parsedId):
+        '''
+        Evaluates the template of the given AssetId with its fields and returns
+        the resulting file path
+        '''
         # Get template
-        templateType = self.__getAssetPublishType(assetId)
+        templateType = parsedId.template
         template = self.tk.templates[templateType]
         if not template:
             log.warning("resolveAsset: Unable to find template: %s" % templateType)
 
+        idFieldDict = parsedId.getFields()
+        if template and VERSION_KEY in template.keys and getStoredVersion(idFieldDict) is None:
+            # Partial asset ID, use the latest version
+            versions = self.__getPublishedVersions(parsedId)
+            if versions:
+                idFieldDict[VERSION_KEY] = versions[-1]
+
         assetFilePathList = self.tk.abstract_paths_from_template( template, idFieldDict )
         assetFilePath = ""
         if len(assetFilePathList) > 0:
@@ -94,64 +722,284 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         return assetFilePath
 
 
+    def __getManifest(self):
+        '''
+        Returns the AssetManifest to answer lookups from, or None if there is
+        none. The manifest is taken from the SHOTGUN_ASSET_MANIFEST environment
+        variable or, in batch sessions only, from next to the current Katana
+        scene. Interactive sessions resolve live, so that partial and "latest"
+        asset IDs pick up new publishes after a render was submitted.
+        '''
+        manifestPath = os.environ.get(MANIFEST_ENV_VAR)
+        if not manifestPath and self.__isBatchMode():
+            manifestPath = self.__getSceneManifestPath()
+
+        # (manifest path, AssetManifest or None), following the open scene
+        manifest = self._manifest
+        if manifest is _MISSING or manifest[0] != manifestPath:
+            with self._setupLock:
+                manifest = self._manifest
+                if manifest is _MISSING or manifest[0] != manifestPath:
+                    manifest = (manifestPath, self.__loadManifest(manifestPath))
+                    self._manifest = manifest
+        return manifest[1]
+
+
+    def __isBatchMode(self):
+        '''
+        Returns whether Katana runs without UI, e.g. on render nodes
+        '''
+        if self._batchMode is None:
+            try:
+                from Katana import Configuration
+                self._batchMode = not Configuration.get("KATANA_UI_MODE")
+            except ImportError:
+                self._batchMode = False
+        return self._batchMode
+
+
+    def __loadManifest(self, manifestPath):
+        '''
+        Opens the AssetManifest at the given path, if any
+        '''
+        if manifestPath and os.path.isfile(manifestPath):
+            try:
+                return AssetManifest(manifestPath)
+            except (IOError, ValueError), e:
+                log.warning("Unable to read asset manifest %s: %s" % (manifestPath, e))
+        return None
+
+
+    def __getSceneManifestPath(self):
+        '''
+        Returns the path of the asset manifest next to the current Katana scene
+        '''
+        try:
+            from Katana import FarmAPI
+            sceneFile = FarmAPI.GetKatanaFileName()
+        except Exception:
+            return None
+        if sceneFile:
+            return sceneFile + MANIFEST_EXTENSION
+
+
+    @instrumented
+    def writeAssetManifest(self, manifestPath=None, assetIds=None):
+        """
+        Resolves every asset ID once and writes the results to an asset
+        manifest, so that render nodes can answer lookups without Toolkit.
+
+        Meant to be called at render submission time. By default the asset IDs
+        are collected from the current scene and the manifest is written next
+        to the scene file. Returns the path of the manifest.
+        """
+        if manifestPath is None:
+            manifestPath = self.__getSceneManifestPath()
+            if not manifestPath:
+                raise ValueError("writeAssetManifest: the scene has not been saved")
+        if assetIds is None:
+            assetIds = collectSceneAssetIds()
+
+        paths = {}
+        for assetId in assetIds:
+            parsedId = self.__parseAssetId(assetId)
+            if not parsedId or not parsedId.fields:
+                continue
+            assetFilePath = self.__resolveFromTemplate(parsedId)
+            if assetFilePath:
+                paths[getManifestKey(parsedId)] = assetFilePath
+
+        AssetManifest.write(manifestPath, paths)
+        log.info("Wrote %d resolved assets to %s" % (len(paths), manifestPath))
+        return manifestPath
+
+
+    @instrumented
     def resolveAllAssets(self, string):
         """
         For each asset ID found in the given string (isolated by whitespaces)
         it will be resolved and the original string will be substituted
         """
-        result = string
+        assetIds = [token for token in set(_TOKEN_RE.findall(string))
+                    if self.__parseAssetId(token)]
+        if not assetIds:
+            return string
+
+        paths = self.__resolveAssets(assetIds)
+        return _TOKEN_RE.sub(lambda match: paths.get(match.group(0)) or match.group(0), string)
+
+
+    @instrumented
+    def resolveAssets(self, assetIds):
+        """
+        Resolves several asset IDs at once. Each distinct asset ID is only
+        resolved once. Returns a dict of file paths keyed by asset ID.
+        """
+        return self.__resolveAssets(assetIds)
 
-        for token in string.split():
-            if self.isAssetId(token):
-                path = self.resolveAsset(token)
-                result = result.replace(token, path)
 
-        return result
+    def __resolveAssets(self, assetIds):
+        '''
+        Resolves several asset IDs, without being timed
+        '''
+        paths = {}
+        for assetId in set(assetIds):
+            paths[assetId] = self.__resolveAsset(assetId)
+        return paths
 
 
-    def resolvePath(self, assetId, frame):  # TODO -- This may need some work to work properly. How do Shotgun and Katana work with file sequences?
+    @instrumented
+    def resolvePath(self, assetId, frame):
         """
         Resolves the given asset ID and if it comes as a file
         sequence then we will resolve that file sequence to the specified
         frame using the currently selected FileSequence plug-in
         """
-        resolvedAsset = self.resolveAsset(assetId)
+        resolvedAsset = self.__resolveAsset(assetId)
         if not resolvedAsset:
             return
 
-        # Get the fileSequence plug-in and if the resolvedAsset is a file sequence
-        # path, then use frame to resolve it
-        fileSequencePlugin = AssetAPI.GetDefaultFileSequencePlugin()
-        if fileSequencePlugin:
-            if fileSequencePlugin.isFileSequence(resolvedAsset):
-                # Get the FileSequence object and resolve the sequence with frame
-                fileSequence = fileSequencePlugin.getFileSequence(resolvedAsset)
-                resolvedAsset = fileSequence.getResolvedPath(frame)
+        fileSequence = self.__getFileSequence(resolvedAsset)
+        if fileSequence:
+            resolvedAsset = fileSequence.getResolvedPath(frame)
 
         return resolvedAsset
 
 
+    @instrumented
+    def resolvePathRange(self, assetId, startFrame, endFrame):
+        """
+        Resolves the given asset ID for every frame from startFrame to endFrame,
+        inclusive. Returns a list holding one path per frame, or None if the
+        asset ID can't be resolved.
+        """
+        resolvedAsset = self.__resolveAsset(assetId)
+        if not resolvedAsset:
+            return
+
+        frames = range(int(startFrame), int(endFrame) + 1)
+        fileSequence = self.__getFileSequence(resolvedAsset)
+        if not fileSequence:
+            return [resolvedAsset] * len(frames)
+        return [fileSequence.getResolvedPath(frame) for frame in frames]
+
+
+    def __getFileSequence(self, resolvedAsset):
+        '''
+        Returns the FileSequence object for the given resolved path, or None if
+        it is not a file sequence. Objects are cached per resolved path.
+        '''
+        fileSequence = self._fileSequenceCache.get(resolvedAsset, _MISSING)
+        if fileSequence is _MISSING:
+            fileSequence = None
+            # Get the fileSequence plug-in and if the resolvedAsset is a file
+            # sequence path, get the FileSequence object for it
+            fileSequencePlugin = AssetAPI.GetDefaultFileSequencePlugin()
+            if fileSequencePlugin and fileSequencePlugin.isFileSequence(resolvedAsset):
+                fileSequence = fileSequencePlugin.getFileSequence(resolvedAsset)
+            self._fileSequenceCache.set(resolvedAsset, fileSequence)
+        return fileSequence
+
+
+    @instrumented
     def resolveAssetVersion(self, assetId, versionTag = ""):
         """
         Returns the version for the given asset ID.
-        If it is a partial asset ID (which doesn't have a version) then None is returned
+        Without a versionTag, this is the version stored in the asset ID or,
+        if it is a partial asset ID (which doesn't have a version), the latest
+        version published on disk. The "latest" tag always gives the latest
+        version, and a version number tag, e.g. "3" or "v003", gives that
+        version if it was published. None is returned if no version matches.
         """
-        # Get fields
-        idFieldDict = self.getAssetFields(assetId)
-        if not idFieldDict:
-            log.warning("resolveAssetVersion: Resolving asset path from asset ID failed: %s" % assetId)
+        return self.__resolveAssetVersions([assetId], versionTag).get(assetId)
+
+
+    @instrumented
+    def resolveAssetVersions(self, assetIds, versionTag = ""):
+        """
+        Resolves the version of several asset IDs at once, see
+        resolveAssetVersion. Asset IDs that only differ by version share a
+        single lookup of the published versions.
+        Returns a dict of versions keyed by asset ID.
+        """
+        return self.__resolveAssetVersions(assetIds, versionTag)
+
+
+    def __resolveAssetVersions(self, assetIds, versionTag):
+        '''
+        Resolves the version of several asset IDs, without being timed so that
+        each call is only counted once in the statistics
+        '''
+        versions = {}
+        for assetId in set(assetIds):
+            parsedId = self.__parseAssetId(assetId)
+            if not parsedId or not parsedId.fields:
+                log.warning("resolveAssetVersion: Resolving asset path from asset ID failed: %s" % assetId)
+                versions[assetId] = None
+            else:
+                versions[assetId] = self.__resolveVersion(parsedId, versionTag)
+        return versions
+
+
+    def __resolveVersion(self, parsedId, versionTag):
+        '''
+        Returns the version the given tag points to for an AssetId
+        '''
+        version = getStoredVersion(parsedId.getFields())
+        if not versionTag and version is not None:
+            return version
+
+        publishedVersions = self.__getPublishedVersions(parsedId)
+        if not versionTag or versionTag == LATEST_VERSION_TAG:
+            return publishedVersions[-1] if publishedVersions else None
+
+        try:
+            version = int(str(versionTag).lstrip("vV"))
+        except ValueError:
+            log.warning("resolveAssetVersion: Unsupported version tag: %s" % versionTag)
             return None
-        # Version
-        return idFieldDict.get("Version", None)
+        return version if version in publishedVersions else None
+
+
+    def __getPublishedVersions(self, parsedId):
+        '''
+        Returns the sorted versions published on disk for the given AssetId,
+        ignoring its own version
+        '''
+        fields = tuple((key, value) for key, value in parsedId.fields
+                       if key not in (VERSION_KEY, "Version"))
+        indexKey = (parsedId.template, fields)
+        versions = self._versionIndex.get(indexKey)
+        if versions is None:
+            versions = self._versionFlight.do(indexKey, self.__scanPublishedVersions, indexKey)
+        return versions
+
 
+    def __scanPublishedVersions(self, indexKey):
+        '''
+        Finds the versions published on disk for a template name and fields,
+        and stores them in the version index
+        '''
+        templateType, fields = indexKey
+        template = self.tk.templates.get(templateType)
+        versions = ()
+        if template and VERSION_KEY in template.keys:
+            paths = self.tk.paths_from_template(template, dict(fields), skip_keys=[VERSION_KEY])
+            found = set(template.get_fields(path).get(VERSION_KEY) for path in paths)
+            found.discard(None)
+            versions = tuple(sorted(found))
+        self._versionIndex[indexKey] = versions
+        return versions
 
+
+    @instrumented
     def getAssetFields(self, assetId, includeDefaults=False):
         """
         Resolves an asset ID to a dict of all of the required fields.
         Returns a dict, keyed by the field names that the corresponding Shotgun template will expect
         """
-        fullDict = eval(str(assetId)) # TODO: Not cool, but works in this case. Switch to json?
-        fieldDict = fullDict.get("fields") or None
+        parsedId = self.__parseAssetId(assetId)
+        fieldDict = parsedId.getFields() if parsedId else None
         if not fieldDict:
             log.warning("getAssetFields: Couldn't find fields in asset ID: %s" % assetId)
         return fieldDict
@@ -161,13 +1009,31 @@ class ShotgunAssetPlugin(AssetAPI.BaseAssetPlugin):
         '''
         Returns the publish "type" of the asset. This is used to work out the Shotgun template to use.
         '''
-        fullDict = eval(str(assetId)) # TODO: Not cool, but works in this case. Switch to json?
-        templateType = fullDict.get("template") or None
+        parsedId = self.__parseAssetId(assetId)
+        templateType = parsedId.template if parsedId else None
         if not templateType:
             log.warning("getAssetFields: Couldn't find template type in asset ID: %s" % assetId)
         return templateType
 
 
+    def __parseAssetId(self, assetId):
+        '''
+        Returns the AssetId parsed from the given asset ID string, or None if it
+        isn't one. Results, including failures of strings looking like a dict,
+        are cached on the raw string.
+        '''
+        key = assetId if isinstance(assetId, basestring) else str(assetId)
+        # Strings which can't be asset IDs, e.g. the paths and flags of
+        # command lines, are not cached so that they never evict asset IDs
+        if not key.lstrip().startswith("{"):
+            return None
+        parsedId = self._assetIdCache.get(key, _MISSING)
+        if parsedId is _MISSING:
+            parsedId = parseAssetId(key)
+            self._assetIdCache.set(key, parsedId)
+        return parsedId
+
+
     def createTransaction(self):
         """
         Creates a transaction object
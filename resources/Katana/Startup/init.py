@@ -3,6 +3,10 @@ Setup the envrionment and menu to run Shotgun tools.
 """
 def bootstrap():
     import os
+    import sys
+    import time
+
+    bootstrap_start = time.time()
 
     try:
         import sgtk
@@ -14,21 +18,43 @@ def bootstrap():
         print "Shotgun: Missing required environment variable TANK_ENGINE."
         return
 
+    # the context registry, shared with the asset plug-in, lives in the python
+    # folder of the resources of this engine
+    for resources_path in os.environ.get("KATANA_RESOURCES", "").split(os.pathsep):
+        python_path = os.path.join(resources_path, "python")
+        if os.path.exists(os.path.join(python_path, "tk_katana_context.py")):
+            if python_path not in sys.path:
+                sys.path.append(python_path)
+            break
+
     engine_name = os.environ.get("TANK_ENGINE")
     try:
-        context = sgtk.context.deserialize(os.environ.get("TANK_CONTEXT"))
+        import tk_katana_context
+        context = tk_katana_context.get_launch_context()
     except Exception, e:
         print "Shotgun: Could not create context! %s" % str(e)
         return
+    if not context:
+        print "Shotgun: Missing required environment variable TANK_CONTEXT."
+        return
 
     try:
+        start_engine_start = time.time()
         engine = sgtk.platform.start_engine(engine_name, context.sgtk, context)
+        start_engine_end = time.time()
     except Exception, e:
         print "Shotgun: Could not start engine: %s" % str(e)
         return
 
-    # clean up temp env vars
-    for var in ["TANK_ENGINE", "TANK_CONTEXT", "TANK_FILE_TO_OPEN"]:
+    # complete the engine start-up trace, if enabled, with the bootstrap phases
+    tracer = getattr(engine, "startup_tracer", None)
+    if tracer:
+        tracer.add_span("start_engine", start_engine_start, start_engine_end)
+        tracer.add_span("bootstrap", bootstrap_start, time.time())
+        tracer.write()
+
+    # clean up temp env vars, later engine restarts are not traced
+    for var in ["TANK_ENGINE", "TANK_CONTEXT", "TANK_FILE_TO_OPEN", "TK_KATANA_STARTUP_TRACE"]:
         if var in os.environ:
             del os.environ[var]
 
@@ -0,0 +1,86 @@
+#
+# Copyright (c) 2013 Shotgun Software, Inc
+# ----------------------------------------------------
+#
+"""
+Hands the Toolkit context over from the launcher to Katana.
+
+The launcher serializes the context into the TANK_CONTEXT environment
+variable. In Katana, the init script and the asset plug-in share the context
+deserialized from it through this module, so that it is only deserialized,
+and its Tank instance only created, once per process.
+"""
+import os
+import zlib
+import base64
+import threading
+
+
+# Marks the compact form of a serialized context, followed by the base64
+# encoded, zlib compressed blob of sgtk.context.serialize()
+COMPACT_PREFIX = "tkz1:"
+
+# Guards the contexts below, the asset plug-in is used from several threads
+_lock = threading.Lock()
+
+# Deserialized contexts keyed by their serialized string
+_contexts = {}
+
+# The serialized context Katana was launched in, kept once TANK_CONTEXT is
+# removed from the environment by the init script
+_launch_context = None
+
+
+def serialize(context):
+    """
+    Serializes a context in compact form.
+
+    :param context: The :class:`sgtk.Context` to serialize.
+    :returns: A string safe to use as an environment variable value.
+    """
+    import sgtk
+
+    blob = sgtk.context.serialize(context)
+    return COMPACT_PREFIX + base64.b64encode(zlib.compress(blob, 9))
+
+
+def deserialize(serialized):
+    """
+    Deserializes a context serialized either in compact form or by
+    sgtk.context.serialize().
+
+    :returns: A :class:`sgtk.Context` with its own Tank instance.
+    """
+    import sgtk
+
+    if serialized.startswith(COMPACT_PREFIX):
+        serialized = zlib.decompress(base64.b64decode(serialized[len(COMPACT_PREFIX):]))
+    return sgtk.context.deserialize(serialized)
+
+
+def get_context(serialized):
+    """
+    Returns the context for a serialized string, deserializing each string
+    only once per process.
+    """
+    with _lock:
+        context = _contexts.get(serialized)
+        if context is None:
+            context = deserialize(serialized)
+            _contexts[serialized] = context
+        return context
+
+
+def get_launch_context():
+    """
+    Returns the context Katana was launched in, from TANK_CONTEXT, or None if
+    Katana was not launched by Toolkit.
+    """
+    global _launch_context
+
+    with _lock:
+        serialized = os.environ.get("TANK_CONTEXT") or _launch_context
+        if not serialized:
+            return None
+        _launch_context = serialized
+    return get_context(serialized)
@@ -9,12 +9,36 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import imp
 import sys
+import json
+import time
+import hashlib
+import socket
+import getpass
+import tempfile
+import threading
+import subprocess
 
 import sgtk
 from sgtk.platform import SoftwareLauncher, SoftwareVersion, LaunchInformation
 
 
+def _load_context_registry():
+    """
+    Loads the context registry the context is handed over to Katana with.
+
+    It is loaded under a module name of its own for each copy of the engine,
+    without changing sys.path, as the launcher process can load several
+    versions of the engine.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "resources", "Katana", "python", "tk_katana_context.py")
+    name = "tk_katana_context_%s" % hashlib.sha1(path).hexdigest()
+    return sys.modules.get(name) or imp.load_source(name, path)
+
+
+tk_katana_context = _load_context_registry()
 
 
 class KatanaLauncher(SoftwareLauncher):
@@ -49,6 +73,25 @@ class KatanaLauncher(SoftwareLauncher):
         ]
     }
 
+    # Number of seconds the Software entities found in Shotgun are trusted for
+    SOFTWARE_CACHE_TTL = 300
+
+    # Whether a Software code exists in Shotgun, with the time it was looked
+    # up, keyed by (Shotgun site, code). Shared by all launcher instances.
+    _software_cache = {}
+
+    # The rez cache below is kept in this directory of the temp directory,
+    # named after the user and only accessible to them.
+    CACHE_DIR_NAME = "tk-katana-%(user)s"
+
+    # The rez package search results and rez module root are cached in this
+    # file of the cache directory, named after the user and host.
+    REZ_CACHE_FILE_NAME = "tk-katana-rez-%(user)s-%(host)s.json"
+
+    # Number of seconds the rez package repositories are scanned for, those
+    # still being scanned are skipped, e.g. a stale network mount
+    REZ_REPOSITORY_TIMEOUT = 10
+
     @property
     def minimum_supported_version(self):
         """
@@ -77,7 +120,7 @@ class KatanaLauncher(SoftwareLauncher):
         self.logger.debug(
             "Preparing Natron Launch via Toolkit Classic methodology ...")
         required_env["TANK_ENGINE"] = self.engine_name
-        required_env["TANK_CONTEXT"] = sgtk.context.serialize(self.context)
+        required_env["TANK_CONTEXT"] = tk_katana_context.serialize(self.context)
         required_env["PYTHONPATH"] = os.environ["PYTHONPATH"]
         required_env["KATANA_RESOURCES"] = startup_path
 
@@ -89,6 +132,21 @@ class KatanaLauncher(SoftwareLauncher):
         args = '"%s"' % startup_path
         return LaunchInformation(exec_path, args, required_env)
 
+    @classmethod
+    def clear_caches(cls):
+        """
+        Removes the rez cache of the current user and host, e.g. once packages
+        were changed without changing the modification times it relies on.
+
+        :returns: The paths of the removed cache files.
+        """
+        removed_paths = []
+        cache_path = cls._get_cache_path(cls.REZ_CACHE_FILE_NAME)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+            removed_paths.append(cache_path)
+        return removed_paths
+
     def _icon_from_engine(self):
         """
         Use the default engine icon as natron does not supply
@@ -103,39 +161,167 @@ class KatanaLauncher(SoftwareLauncher):
 
     def scan_software(self):
 
-        try:
-            import rez as _
-        except ImportError:
-            rez_path = self.get_rez_module_root()
-            if not rez_path:
-                raise EnvironmentError('rez is not installed and could not be automatically found. Cannot continue.')
-
-            sys.path.append(rez_path)
-        from rez.package_search import ResourceSearcher , ResourceSearchResultFormatter
-
-
-        searcher = ResourceSearcher()
-        formatter = ResourceSearchResultFormatter()
-        _ ,packages = searcher.search("katana")
-
         supported_sw_versions = []
         self.logger.debug("Scanning for katana executables...")
-        infos = formatter.format_search_results(packages)
-        for info in infos:
-            name,version = info[0].split("-")
+        for package in self._find_rez_packages("katana"):
+            name,version = str(package).split("-")
             
 
             software = SoftwareVersion(version,name,"rez_init",self._icon_from_engine())
             
             (supported, reason) = self._is_supported(software)
             if supported:
-                if self.check_software(software):
-                    supported_sw_versions.append(software)
+                supported_sw_versions.append(software)
+
+        # Only keep the versions with a Software entity, all looked up at once
+        codes = self.find_software_codes(
+            [self._get_software_code(software) for software in supported_sw_versions])
+        return [
+            software for software in supported_sw_versions
+            if self._get_software_code(software) in codes
+        ]
+
+    def _find_rez_packages(self, family):
+        """
+        Finds the packages of a family in the rez package repositories.
+
+        Each repository of REZ_PACKAGES_PATH is scanned on its own thread,
+        using its cached results if it did not change, so that a slow
+        repository only delays the scan by REZ_REPOSITORY_TIMEOUT seconds.
+        The repositories which could not be scanned in time are skipped, or
+        their last cached results used.
+
+        rez is made importable once, on its own thread as well, before the
+        first repository which changed is searched, as finding it checks all
+        the repositories.
+
+        :param str family: The package family, e.g. "katana".
+        :returns: The found packages as "name-version" strings, in the order
+                  of the repositories and without duplicates.
+        """
+        repositories = self._get_rez_repositories()
+        if not repositories:
+            # Let rez use the repositories of its configuration
+            self._import_rez()
+            return self._search_rez_packages(family)
+
+        deadline = time.time() + self.REZ_REPOSITORY_TIMEOUT
+        cache = self._read_rez_cache()
+        # (packages, new cache entry or None) keyed by repository
+        results = {}
+        rez_imported = threading.Event()
+        # The thread making rez importable, started by the first repository
+        # to search. The lock is only held to start it.
+        rez_threads = []
+        rez_threads_lock = threading.Lock()
+
+        def import_rez():
+            try:
+                self._import_rez()
+                rez_imported.set()
+            except Exception, e:
+                self.logger.warning("Could not import rez: %s" % e)
+
+        def wait_for_rez():
+            with rez_threads_lock:
+                if not rez_threads:
+                    rez_thread = threading.Thread(target=import_rez, name="tk-katana rez import")
+                    rez_thread.daemon = True
+                    rez_thread.start()
+                    rez_threads.append(rez_thread)
+            rez_threads[0].join(max(0, deadline - time.time()))
+            return rez_imported.is_set()
+
+        def scan_repository(repository):
+            key = "%s:%s" % (family, repository)
+            try:
+                mtimes = self._get_rez_repository_mtimes(family, [repository])
+                entry = cache.get(key)
+                if entry and entry["mtimes"] == mtimes:
+                    results[repository] = (entry["value"], None)
+                    return
+                if wait_for_rez():
+                    packages = self._search_rez_packages(family, [repository])
+                    results[repository] = (packages, {"mtimes": mtimes, "value": packages})
+            except Exception, e:
+                self.logger.warning("Could not scan rez repository %s: %s" % (repository, e))
+
+        threads = []
+        for repository in repositories:
+            thread = threading.Thread(target=scan_repository, args=(repository,),
+                                      name="tk-katana rez scan %s" % repository)
+            # Threads stuck on a dead mount must not keep the process alive
+            thread.daemon = True
+            thread.start()
+            threads.append((repository, thread))
+
+        found_packages = []
+        new_entries = {}
+        for repository, thread in threads:
+            thread.join(max(0, deadline - time.time()))
+            key = "%s:%s" % (family, repository)
+            if thread.is_alive() or repository not in results:
+                if thread.is_alive():
+                    self.logger.warning("Scanning rez repository %s timed out after %s seconds."
+                                        % (repository, self.REZ_REPOSITORY_TIMEOUT))
+                # Better use what the repository last held than nothing
+                if key not in cache:
+                    continue
+                packages, entry = cache[key]["value"], None
+            else:
+                packages, entry = results[repository]
+            if entry is not None:
+                new_entries[key] = entry
+            for package in packages:
+                if package not in found_packages:
+                    found_packages.append(package)
+
+        if new_entries:
+            # The cache is read again, as the scan itself may have written
+            # to it, e.g. the rez root
+            cache = self._read_rez_cache()
+            cache.update(new_entries)
+            self._write_rez_cache(cache)
+        return found_packages
+
+    def _search_rez_packages(self, family, repositories=None):
+        """
+        Searches rez package repositories for the packages of a family, rez
+        having been made importable by :meth:`_import_rez`.
+
+        :param str family: The package family, e.g. "katana".
+        :param list repositories: The repositories to search, those of the
+                                  rez configuration if None.
+        :returns: The found packages as "name-version" strings.
+        """
+        from rez.package_search import ResourceSearcher , ResourceSearchResultFormatter
 
-        return supported_sw_versions
 
+        searcher = ResourceSearcher(package_paths=repositories)
+        formatter = ResourceSearchResultFormatter()
+        _ ,packages = searcher.search(family)
+
+        infos = formatter.format_search_results(packages)
+        return [info[0] for info in infos]
+
+    def _import_rez(self):
+        """
+        Makes rez importable, finding where it is installed if needed.
+        """
+        try:
+            import rez as _
+        except ImportError:
+            rez_path = self.get_rez_module_root()
+            if not rez_path:
+                raise EnvironmentError('rez is not installed and could not be automatically found. Cannot continue.')
+
+            sys.path.append(rez_path)
 
     def get_rez_module_root(self):
+
+        return self._get_cached_rez_value("rez_root", "rez", self._find_rez_module_root)
+
+    def _find_rez_module_root(self):
         
         
         command = self.get_rez_root_command()
@@ -155,13 +341,186 @@ class KatanaLauncher(SoftwareLauncher):
 
         return 'rez-env rez -- printenv REZ_REZ_ROOT'
 
+    def _get_rez_repositories(self):
+        """
+        Returns the rez package repositories listed by REZ_PACKAGES_PATH.
+        """
+        return [
+            repository
+            for repository in os.environ.get("REZ_PACKAGES_PATH", "").split(os.pathsep)
+            if repository
+        ]
+
+    @classmethod
+    def _get_cache_path(cls, file_name):
+        """
+        Returns the path of a cache file of the current user and host.
+
+        :param str file_name: The file name, with "user" and "host" fields.
+        """
+        fields = {
+            "user": getpass.getuser(),
+            "host": socket.gethostname(),
+        }
+        return os.path.join(
+            tempfile.gettempdir(), cls.CACHE_DIR_NAME % fields, file_name % fields)
+
+    def _read_cache(self, cache_path):
+        """
+        Reads a cache file, returning an empty cache if it is missing.
+        """
+        try:
+            self._check_cache_dir(os.path.dirname(cache_path))
+            with open(cache_path) as cache_file:
+                return json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_cache(self, cache_path, cache):
+        """
+        Writes a cache file, only readable by the current user.
+        """
+        # Written to a temporary file first, so that concurrent launchers
+        # never read a partially written cache
+        temp_path = "%s.%d" % (cache_path, os.getpid())
+        try:
+            self._check_cache_dir(os.path.dirname(cache_path), create=True)
+        except OSError, e:
+            self.logger.warning("Could not write cache %s: %s" % (cache_path, e))
+            return
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as cache_file:
+                json.dump(cache, cache_file)
+            os.rename(temp_path, cache_path)
+        except (IOError, OSError, UnicodeDecodeError), e:
+            self.logger.warning("Could not write cache %s: %s" % (cache_path, e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _check_cache_dir(self, cache_dir, create=False):
+        """
+        Checks that the cache directory belongs to the current user, as
+        anyone could have created it in the temp directory beforehand.
+
+        :param bool create: Whether to create the directory, only accessible
+                            to the current user, if it is missing.
+        :raises OSError: If the directory is missing or belongs to another
+                         user.
+        """
+        if create and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+        if hasattr(os, "getuid") and os.stat(cache_dir).st_uid != os.getuid():
+            raise OSError("%s belongs to another user" % cache_dir)
+
+    def _read_rez_cache(self):
+        """
+        Reads the rez cache file, returning an empty cache if it is missing.
+        """
+        return self._read_cache(self._get_cache_path(self.REZ_CACHE_FILE_NAME))
+
+    def _write_rez_cache(self, cache):
+        """
+        Writes the rez cache file.
+        """
+        self._write_cache(self._get_cache_path(self.REZ_CACHE_FILE_NAME), cache)
+
+    def _get_rez_repository_mtimes(self, family, repositories=None):
+        """
+        Returns the modification times of the rez package repositories and of
+        their directory for the given package family, keyed by path.
+
+        Releasing a new version of a package adds a directory to its family
+        directory, which changes the modification time of the latter.
+
+        :param list repositories: The repositories to check, all those of
+                                  REZ_PACKAGES_PATH if None.
+        """
+        if repositories is None:
+            repositories = self._get_rez_repositories()
+
+        mtimes = {}
+        for repository in repositories:
+            for path in (repository, os.path.join(repository, family)):
+                try:
+                    mtimes[path] = os.path.getmtime(path)
+                except OSError:
+                    mtimes[path] = None
+        return mtimes
+
+    def _get_cached_rez_value(self, key, family, compute):
+        """
+        Returns a value computed from the rez package repositories, cached on
+        disk until the repositories or their directory for the given package
+        family change.
+
+        Nothing is cached when REZ_PACKAGES_PATH is not set, as the
+        repositories to watch can't be known without loading rez.
+
+        :param str key: The key of the value in the cache.
+        :param str family: The package family the value depends on.
+        :param compute: Called to compute the value when it's not cached.
+        """
+        mtimes = self._get_rez_repository_mtimes(family)
+        if not mtimes:
+            return compute()
+
+        cache = self._read_rez_cache()
+        entry = cache.get(key)
+        if entry and entry["mtimes"] == mtimes:
+            self.logger.debug("Using rez %s cached in %s"
+                              % (key, self._get_cache_path(self.REZ_CACHE_FILE_NAME)))
+            return entry["value"]
+
+        value = compute()
+        if value:
+            cache[key] = {"mtimes": mtimes, "value": value}
+            self._write_rez_cache(cache)
+        return value
+
     def check_software(self,software):
 
-        filter_dict = [
-                    ['code','is',software.product+" "+software.version],
-                      ]
-        packages = self.shotgun.find("Software",filter_dict)
+        code = self._get_software_code(software)
+        return code in self.find_software_codes([code])
+
+    def find_software_codes(self, codes):
+        """
+        Finds which of the given codes have a Software entity in Shotgun.
+
+        The codes looked up within the last SOFTWARE_CACHE_TTL seconds are
+        answered from memory, the others are looked up with a single query.
+
+        :param list codes: Software codes, e.g. "katana 3.0v7".
+        :returns: The set of the given codes found in Shotgun.
+        """
+        site = getattr(self.shotgun, "base_url", None)
+        now = time.time()
+        cache = KatanaLauncher._software_cache
+
+        expired = [
+            code for code in set(codes)
+            if now - cache.get((site, code), (0, False))[0] > self.SOFTWARE_CACHE_TTL
+        ]
+        if expired:
+            self.logger.debug("Looking up Software entities: %s" % ", ".join(expired))
+            found = self.shotgun.find("Software", [["code", "in", expired]], ["code"])
+            found_codes = set(entity["code"] for entity in found)
+            for code in expired:
+                cache[(site, code)] = (now, code in found_codes)
+
+        return set(code for code in codes if cache[(site, code)][1])
+
+    def _get_software_code(self, software):
+        """
+        Returns the code of the Software entity of a SoftwareVersion.
+        """
+        return software.product + " " + software.version
+
 
-        if packages:
-            return True
-        return False
+if __name__ == "__main__":
+    # Run with the Toolkit python to clear the rez cache:
+    #   python startup.py clear-cache
+    if sys.argv[1:] != ["clear-cache"]:
+        sys.exit("Usage: %s clear-cache" % sys.argv[0])
+    for removed_path in KatanaLauncher.clear_caches():
+        print "Removed %s" % removed_path
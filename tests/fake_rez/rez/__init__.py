@@ -0,0 +1,3 @@
+"""
+Stand-in for rez, only importable once its root is found by the launcher.
+"""
@@ -0,0 +1,32 @@
+"""
+Stand-in for rez.package_search, finding the "<family>/<version>" directories
+of the package repositories.
+"""
+import os
+import time
+
+
+# Seconds a repository takes to be searched, keyed by repository
+g_search_delays = {}
+
+
+class ResourceSearcher(object):
+
+    def __init__(self, package_paths=None):
+        self.package_paths = package_paths or []
+
+    def search(self, family):
+        packages = []
+        for repository in self.package_paths:
+            time.sleep(g_search_delays.get(repository, 0))
+            family_path = os.path.join(repository, family)
+            if os.path.isdir(family_path):
+                packages.extend(
+                    "%s-%s" % (family, version) for version in sorted(os.listdir(family_path)))
+        return "package", packages
+
+
+class ResourceSearchResultFormatter(object):
+
+    def format_search_results(self, packages):
+        return [(package,) for package in packages]
@@ -0,0 +1,160 @@
+"""
+Helpers shared by the tests and benchmarks.
+
+The engine runs in Katana's Python 2 interpreter, and so do the tests, with
+stand-ins for the Katana and Toolkit modules found in tests/stubs:
+
+    python -m unittest discover -s tests
+"""
+import os
+import imp
+import sys
+import logging
+import subprocess
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUBS_PATH = os.path.join(ROOT_PATH, "tests", "stubs")
+PYTHON_PATH = os.path.join(ROOT_PATH, "python")
+ASSET_PLUGIN_PATH = os.path.join(
+    ROOT_PATH, "resources", "Katana", "AssetPlugins", "ShotgunAssetPlugin.py")
+STARTUP_PATH = os.path.join(ROOT_PATH, "startup.py")
+# Where the stand-in rez is installed, not importable until found
+FAKE_REZ_PATH = os.path.join(ROOT_PATH, "tests", "fake_rez")
+
+for path in (PYTHON_PATH, STUBS_PATH):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# The warnings logged on purpose by the tests are not shown
+logging.getLogger("ShotgunAssetPlugin").addHandler(logging.NullHandler())
+logging.getLogger("sgtk").addHandler(logging.NullHandler())
+
+
+def load_asset_plugin():
+    """
+    Loads a fresh copy of the ShotgunAssetPlugin module.
+    """
+    return imp.load_source("ShotgunAssetPlugin", ASSET_PLUGIN_PATH)
+
+
+def load_startup():
+    """
+    Loads a fresh copy of the startup module.
+    """
+    return imp.load_source("tk_katana_startup", STARTUP_PATH)
+
+
+def run_python(code, env=None):
+    """
+    Runs code in a new interpreter with the stubs importable, so that it
+    starts without any module imported, and returns what it printed.
+    """
+    environ = dict(os.environ)
+    environ.update(env or {})
+    environ["PYTHONPATH"] = os.pathsep.join([STUBS_PATH, PYTHON_PATH, ROOT_PATH])
+    return subprocess.check_output([sys.executable, "-c", code], env=environ)
+
+
+class FakeTemplate(object):
+    """
+    A template of a "/<Shot>/v<version>" path.
+    """
+
+    keys = {"Shot": None, "version": None}
+
+    def get_fields(self, path):
+        return {"version": int(path.rsplit("v", 1)[-1])}
+
+
+class FakeTank(object):
+    """
+    A Tank instance resolving FakeTemplate paths, with the given versions
+    published on disk. Template evaluations are counted.
+    """
+
+    def __init__(self, versions=(1, 2)):
+        self.templates = {"shot_publish": FakeTemplate()}
+        self.versions = versions
+        self.evaluations = 0
+
+    def abstract_paths_from_template(self, template, fields):
+        self.evaluations += 1
+        return [u"/%s/v%s" % (fields["Shot"], fields.get("version"))]
+
+    def paths_from_template(self, template, fields, skip_keys=None):
+        self.evaluations += 1
+        return ["/%s/v%d" % (fields["Shot"], version) for version in self.versions]
+
+
+def make_asset_id(shot, version=None, template="shot_publish"):
+    """
+    Returns the asset ID of a shot publish, a partial one if no version is given.
+    """
+    fields = {"Shot": shot}
+    if version is not None:
+        fields["version"] = version
+    return repr({"template": template, "fields": fields})
+
+
+class FakeApp(object):
+    """
+    An app as seen by the menu generator.
+    """
+
+    def __init__(self, display_name):
+        self.display_name = display_name
+        self.documentation_url = None
+
+
+class FakeMenuEngine(object):
+    """
+    An engine with the given number of apps, each registering the given
+    number of commands, the first favourite_count of which are favourites.
+    """
+
+    def __init__(self, app_count, commands_per_app, favourite_count=0, context="Shot sh010"):
+        self.context = context
+        self.apps = {}
+        self.commands = {}
+        favourites = []
+        for app_index in range(app_count):
+            instance_name = "tk-multi-app%03d" % app_index
+            app = FakeApp("App %03d" % app_index)
+            self.apps[instance_name] = app
+            for command_index in range(commands_per_app):
+                name = "Command %03d-%d..." % (app_index, command_index)
+                self.commands[name] = {
+                    "callback": lambda: None,
+                    "properties": {"app": app, "type": "default"},
+                }
+                if len(favourites) < favourite_count:
+                    favourites.append({"app_instance": instance_name, "name": name})
+        self.settings = {"menu_favourites": favourites}
+
+    def get_setting(self, name, default=None):
+        return self.settings.get(name, default)
+
+    def log_debug(self, msg):
+        pass
+
+    def log_error(self, msg):
+        pass
+
+
+def get_menu_generator_class():
+    """
+    Returns a MenuGenerator adding its menu to a fake menu bar.
+    """
+    from Katana import QtWidgets
+    from tk_katana.menu_generation import MenuGenerator
+
+    class TestMenuGenerator(MenuGenerator):
+
+        main_bar = QtWidgets.QMenuBar()
+
+        @classmethod
+        def get_katana_main_bar(cls):
+            return cls.main_bar
+
+    return TestMenuGenerator
@@ -0,0 +1,42 @@
+"""
+Stand-in for Katana's AssetAPI module, enough to load and drive asset plug-ins.
+"""
+
+# Asset plug-ins registered so far, keyed by name
+g_plugins = {}
+
+
+class BaseAssetPlugin(object):
+    pass
+
+
+def RegisterAssetPlugin(name, plugin):
+    g_plugins[name] = plugin
+
+
+class FileSequence(object):
+    """
+    A file sequence of a printf style path, e.g. /renders/beauty.%04d.exr
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def getResolvedPath(self, frame):
+        return self.path % frame
+
+
+class FileSequencePlugin(object):
+
+    def isFileSequence(self, path):
+        return "%" in path
+
+    def getFileSequence(self, path):
+        return FileSequence(path)
+
+
+g_file_sequence_plugin = FileSequencePlugin()
+
+
+def GetDefaultFileSequencePlugin():
+    return g_file_sequence_plugin
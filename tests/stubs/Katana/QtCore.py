@@ -0,0 +1 @@
+from fakeqt import *
@@ -0,0 +1,36 @@
+"""
+Stand-in for the Katana module. Its Qt modules are fakes which only record
+what is done with them, see fakeqt.
+"""
+
+
+class Configuration(object):
+
+    # Configuration values, KATANA_UI_MODE is off like in batch sessions
+    values = {}
+
+    @classmethod
+    def get(cls, name):
+        return cls.values.get(name)
+
+
+class Callbacks(object):
+
+    class Type(object):
+        onStartupComplete = "onStartupComplete"
+        onSceneLoad = "onSceneLoad"
+        onSceneSave = "onSceneSave"
+
+    @staticmethod
+    def addCallback(callback_type, callback):
+        pass
+
+
+class FarmAPI(object):
+
+    # The file name of the scene currently open
+    file_name = None
+
+    @classmethod
+    def GetKatanaFileName(cls):
+        return cls.file_name
@@ -0,0 +1,293 @@
+"""
+Fake Qt classes standing in for Katana's QtCore, QtGui and QtWidgets.
+
+Nothing is drawn: menus and actions only keep track of their contents, and
+every action not deleted yet is kept in g_live_actions so that tests can
+check for leaks.
+"""
+
+# Actions created and not deleted yet
+g_live_actions = set()
+
+
+class Signal(object):
+
+    def __init__(self):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def disconnect(self, slot):
+        self.slots.remove(slot)
+
+    def emit(self, *args):
+        for slot in list(self.slots):
+            slot(*args)
+
+
+class Qt(object):
+    transparent = 0
+    Popup = 0
+    ApplicationShortcut = 0
+    Key_Up = 0
+    Key_Down = 1
+
+
+class QObject(object):
+
+    def __init__(self, parent=None):
+        self._parent = parent
+        self._children = []
+        if isinstance(parent, QObject):
+            parent._children.append(self)
+
+    def parent(self):
+        return self._parent
+
+    def children(self):
+        return list(self._children)
+
+    def deleteLater(self):
+        if isinstance(self._parent, QObject) and self in self._parent._children:
+            self._parent._children.remove(self)
+        for child in list(self._children):
+            child.deleteLater()
+
+
+class QAction(QObject):
+
+    def __init__(self, text="", parent=None, triggered=None):
+        if isinstance(text, QObject):
+            text, parent = "", text
+        super(QAction, self).__init__(parent)
+        self._text = text
+        self._menu = None
+        self.triggered = Signal()
+        if triggered:
+            self.triggered.connect(triggered)
+        g_live_actions.add(self)
+
+    def text(self):
+        return self._text
+
+    def setText(self, text):
+        self._text = text
+
+    def setSeparator(self, separator):
+        pass
+
+    def setShortcut(self, shortcut):
+        pass
+
+    def setShortcutContext(self, context):
+        pass
+
+    def setIcon(self, icon):
+        pass
+
+    def menu(self):
+        return self._menu
+
+    def deleteLater(self):
+        super(QAction, self).deleteLater()
+        g_live_actions.discard(self)
+
+
+class QMenu(QObject):
+
+    def __init__(self, title="", parent=None):
+        super(QMenu, self).__init__(parent)
+        self._title = title
+        self._actions = []
+        self._menu_action = QAction(title, self)
+        self._menu_action._menu = self
+        self.aboutToShow = Signal()
+
+    def title(self):
+        return self._title
+
+    def setTitle(self, title):
+        self._title = title
+
+    def menuAction(self):
+        return self._menu_action
+
+    def actions(self):
+        return list(self._actions)
+
+    def addAction(self, action):
+        if not isinstance(action, QAction):
+            action = QAction(action, self)
+        self._actions.append(action)
+        return action
+
+    def addMenu(self, menu):
+        if not isinstance(menu, QMenu):
+            menu = QMenu(menu, self)
+        self._actions.append(menu.menuAction())
+        return menu
+
+    def addSeparator(self):
+        action = QAction(self)
+        action.setSeparator(True)
+        return self.addAction(action)
+
+    def insertAction(self, before, action):
+        if action in self._actions:
+            self._actions.remove(action)
+        if before is None or before not in self._actions:
+            self._actions.append(action)
+        else:
+            self._actions.insert(self._actions.index(before), action)
+
+    def removeAction(self, action):
+        if action in self._actions:
+            self._actions.remove(action)
+
+    def clear(self):
+        # Qt deletes the actions owned by the menu
+        for action in self._actions:
+            if action.parent() is self:
+                action.deleteLater()
+        self._actions = []
+
+
+class QMenuBar(QMenu):
+    pass
+
+
+class QDialog(QObject):
+
+    def __init__(self, parent=None, flags=None):
+        super(QDialog, self).__init__(parent)
+
+    def resize(self, width, height):
+        pass
+
+    def hide(self):
+        pass
+
+
+class QLineEdit(QObject):
+
+    def __init__(self, parent=None):
+        super(QLineEdit, self).__init__(parent)
+        self.textChanged = Signal()
+        self.returnPressed = Signal()
+
+    def setPlaceholderText(self, text):
+        pass
+
+
+class QListWidgetItem(object):
+
+    def __init__(self, text):
+        self._text = text
+
+    def text(self):
+        return self._text
+
+
+class QListWidget(QObject):
+
+    def __init__(self, parent=None):
+        super(QListWidget, self).__init__(parent)
+        self.itemActivated = Signal()
+        self._items = []
+        self._row = -1
+
+    def clear(self):
+        self._items = []
+
+    def addItems(self, texts):
+        self._items.extend(QListWidgetItem(text) for text in texts)
+
+    def item(self, row):
+        return self._items[row]
+
+    def row(self, item):
+        return self._items.index(item)
+
+    def count(self):
+        return len(self._items)
+
+    def currentRow(self):
+        return self._row
+
+    def setCurrentRow(self, row):
+        self._row = row
+
+    def currentItem(self):
+        if 0 <= self._row < len(self._items):
+            return self._items[self._row]
+
+
+class QVBoxLayout(QObject):
+
+    def setContentsMargins(self, *margins):
+        pass
+
+    def addWidget(self, widget):
+        pass
+
+
+class QKeySequence(object):
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+
+
+class QIcon(object):
+
+    def __init__(self, source=None):
+        self.source = source
+
+    def isNull(self):
+        return self.source is None
+
+
+class QPixmap(object):
+
+    def __init__(self, *args):
+        pass
+
+    def fill(self, color):
+        pass
+
+    @staticmethod
+    def fromImage(image):
+        return QPixmap()
+
+
+class QImage(object):
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def isNull(self):
+        return self.path is None
+
+
+class QTimer(QObject):
+
+    def __init__(self, parent=None):
+        super(QTimer, self).__init__(parent)
+        self.timeout = Signal()
+        self._active = False
+
+    def setInterval(self, interval):
+        pass
+
+    def start(self, interval=None):
+        self._active = True
+
+    def stop(self):
+        self._active = False
+
+    def isActive(self):
+        return self._active
+
+    @staticmethod
+    def singleShot(interval, callback):
+        pass
@@ -0,0 +1,11 @@
+"""
+Stand-in for sgtk, which is the same module as tank.
+"""
+import sys
+
+import tank
+import tank.platform
+
+# Last, as replacing this module clears its globals
+sys.modules["sgtk.platform"] = tank.platform
+sys.modules["sgtk"] = tank
@@ -0,0 +1,14 @@
+"""
+Stand-in for the Toolkit core API, recording what the code under test does
+with it.
+"""
+from . import context
+from . import platform
+
+
+class TankError(Exception):
+    pass
+
+
+class TankEngineInitError(TankError):
+    pass
@@ -0,0 +1,58 @@
+"""
+Stand-in for tank.context, where contexts are plain dicts pickled as is.
+"""
+import os
+import pickle
+import time
+
+
+# Strings deserialized so far
+g_deserialized = []
+
+# Seconds each deserialization takes, like creating a real Tank instance
+g_deserialize_delay = float(os.environ.get("TANK_STUB_DESERIALIZE_DELAY") or 0)
+
+
+class Context(object):
+
+    def __init__(self, data):
+        self.data = data
+        # A real context carries the Tank instance it was created with
+        self.tank = object()
+
+    @property
+    def project(self):
+        return self.data.get("project")
+
+    @property
+    def entity(self):
+        return self.data.get("entity")
+
+    @property
+    def step(self):
+        return self.data.get("step")
+
+    @property
+    def task(self):
+        return self.data.get("task")
+
+    @property
+    def user(self):
+        return self.data.get("user")
+
+    @property
+    def additional_entities(self):
+        return self.data.get("additional_entities", [])
+
+    def __eq__(self, other):
+        return isinstance(other, Context) and self.data == other.data
+
+
+def serialize(context):
+    return pickle.dumps(context.data)
+
+
+def deserialize(serialized):
+    time.sleep(g_deserialize_delay)
+    g_deserialized.append(serialized)
+    return Context(pickle.loads(serialized))
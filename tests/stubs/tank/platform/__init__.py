@@ -0,0 +1,86 @@
+"""
+Stand-in for tank.platform.
+"""
+import logging
+
+from . import application
+
+
+# The engine returned by current_engine()
+g_current_engine = None
+
+
+def current_engine():
+    return g_current_engine
+
+
+def change_context(new_context):
+    g_current_engine.context = new_context
+
+
+# The Qt bindings the Engine base class tried to import
+g_qt_probes = []
+
+
+class Engine(object):
+    """
+    Starts up like a Toolkit engine: sets up Qt, then initializes the engine
+    and its (here no) apps.
+    """
+
+    def __init__(self, tk=None, context=None, engine_instance_name="tk-katana", env=None):
+        self.instance_name = engine_instance_name
+        self.context = context
+        self.apps = {}
+        self.commands = {}
+        self.settings = {}
+        self._define_qt_base()
+        self._define_qt5_base()
+        self.init_engine()
+        self.pre_app_init()
+        self.post_app_init()
+
+    def _define_qt_base(self):
+        g_qt_probes.append("PySide")
+        return {}
+
+    def _define_qt5_base(self):
+        g_qt_probes.append("PySide2")
+        return {}
+
+    def get_setting(self, name, default=None):
+        return self.settings.get(name, default)
+
+    def import_module(self, name):
+        return __import__(name)
+
+
+class SoftwareLauncher(object):
+
+    def __init__(self, tk=None, context=None, engine_name="tk-katana", env=None,
+                 disk_location=None):
+        self.context = context
+        self.engine_name = engine_name
+        self.disk_location = disk_location
+        self.shotgun = None
+        self.logger = logging.getLogger("sgtk.%s.startup" % engine_name)
+
+    def _is_supported(self, sw_version):
+        return (True, "")
+
+
+class SoftwareVersion(object):
+
+    def __init__(self, version, product, path, icon=None):
+        self.version = version
+        self.product = product
+        self.path = path
+        self.icon = icon
+
+
+class LaunchInformation(object):
+
+    def __init__(self, path=None, args=None, environ=None):
+        self.path = path
+        self.args = args
+        self.environment = environ
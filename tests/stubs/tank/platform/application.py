@@ -0,0 +1,22 @@
+"""
+Stand-in for tank.platform.application.
+"""
+
+
+class Application(object):
+
+    def init_app(self):
+        pass
+
+    def post_engine_init(self):
+        pass
+
+    def pre_context_change(self, old_context, new_context):
+        pass
+
+    def post_context_change(self, old_context, new_context):
+        pass
+
+
+def get_application(engine, app_folder, descriptor, settings, instance_name, env):
+    raise NotImplementedError
@@ -0,0 +1,217 @@
+"""
+Tests of the Shotgun asset plug-in against a stand-in AssetAPI.
+"""
+import os
+import json
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from helpers import ASSET_PLUGIN_PATH, FakeTank, load_asset_plugin, make_asset_id, run_python
+from Katana import Configuration, FarmAPI
+
+
+class TestAssetIds(unittest.TestCase):
+
+    def setUp(self):
+        self.module = load_asset_plugin()
+        self.plugin = self.module.ShotgunAssetPlugin()
+        self.plugin.tk = FakeTank()
+
+    def test_parse(self):
+        parsed = self.module.parseAssetId(make_asset_id("sh010", 3))
+        self.assertEqual(parsed.template, "shot_publish")
+        self.assertEqual(parsed.getFields(), {"Shot": "sh010", "version": 3})
+
+    def test_reject_non_ids(self):
+        for string in ["/show/sh010/v001/beauty.exr", "{", "{'template': 1}",
+                       "[1, 2]", "{'template': 't', 'fields': {'a': [1]}}",
+                       "__import__('os')"]:
+            self.assertIsNone(self.module.parseAssetId(string), string)
+            self.assertFalse(self.plugin.isAssetId(string), string)
+
+    def test_non_ascii_strings(self):
+        self.assertFalse(self.plugin.isAssetId(u"/p\xe9"))
+        self.assertEqual(self.plugin.resolveAsset(u"/p\xe9"), u"/p\xe9")
+        assetId = u"{'template': 'shot_publish', 'fields': {'Shot': u'sh\xe9', 'version': 1}}"
+        self.assertTrue(self.plugin.isAssetId(assetId))
+        self.assertEqual(self.plugin.getAssetFields(assetId), {"Shot": u"sh\xe9", "version": 1})
+
+    def test_command_line_tokens_not_cached(self):
+        assetId = make_asset_id("sh010", 1).replace(" ", "")
+        self.plugin.isAssetId(assetId)
+        paths = " ".join("/show/sh010/plate.%d.exr" % index
+                         for index in range(self.module.ASSET_ID_CACHE_SIZE * 2))
+        self.assertEqual(self.plugin.resolveAllAssets(paths + " " + assetId),
+                         paths + " /sh010/v1")
+
+        self.assertEqual(len(self.plugin._assetIdCache), 1)
+        self.assertIsNotNone(self.plugin._assetIdCache.get(assetId))
+
+    def test_reset_clears_parsed_ids(self):
+        self.plugin.isAssetId(make_asset_id("sh010", 1))
+        self.plugin.reset()
+        self.assertEqual(len(self.plugin._assetIdCache), 0)
+
+
+class TestAssetManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.module = load_asset_plugin()
+        self.tempDir = tempfile.mkdtemp()
+        self.scene = os.path.join(self.tempDir, "sh010.katana")
+        FarmAPI.file_name = self.scene
+        Configuration.values = {}
+        os.environ.pop(self.module.MANIFEST_ENV_VAR, None)
+
+        # Submission: the asset IDs of the scene are written next to it
+        self.fullId = make_asset_id("sh010", 1)
+        self.partialId = make_asset_id("sh010")
+        submitter = self.module.ShotgunAssetPlugin()
+        submitter.tk = FakeTank(versions=(1, 2))
+        self.manifestPath = submitter.writeAssetManifest(assetIds=[self.fullId, self.partialId])
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+        Configuration.values = {}
+        FarmAPI.file_name = None
+        os.environ.pop(self.module.MANIFEST_ENV_VAR, None)
+
+    def makePlugin(self, versions=(1, 2, 3)):
+        plugin = self.module.ShotgunAssetPlugin()
+        plugin.tk = FakeTank(versions)
+        return plugin
+
+    def test_write(self):
+        self.assertEqual(self.manifestPath, self.scene + self.module.MANIFEST_EXTENSION)
+        manifest = self.module.AssetManifest(self.manifestPath)
+        key = self.module.getManifestKey(self.module.parseAssetId(self.partialId))
+        self.assertEqual(manifest.get(key), "/sh010/v2")
+        manifest.close()
+
+    def test_batch_session_uses_scene_manifest(self):
+        plugin = self.makePlugin()
+        self.assertEqual(plugin.resolveAsset(self.fullId), "/sh010/v1")
+        # Pinned to the version latest at submission time
+        self.assertEqual(plugin.resolveAsset(self.partialId), "/sh010/v2")
+        self.assertEqual(plugin.tk.evaluations, 0)
+
+        # Asset IDs missing from the manifest are resolved live
+        self.assertEqual(plugin.resolveAsset(make_asset_id("sh020", 4)), "/sh020/v4")
+        self.assertEqual(plugin.tk.evaluations, 1)
+
+    def test_interactive_session_ignores_scene_manifest(self):
+        Configuration.values = {"KATANA_UI_MODE": True}
+        plugin = self.makePlugin()
+        self.assertEqual(plugin.resolveAsset(self.partialId), "/sh010/v3")
+        self.assertEqual(plugin.tk.evaluations, 2)
+
+    def test_explicit_manifest(self):
+        Configuration.values = {"KATANA_UI_MODE": True}
+        os.environ[self.module.MANIFEST_ENV_VAR] = self.manifestPath
+        FarmAPI.file_name = None
+        plugin = self.makePlugin()
+        self.assertEqual(plugin.resolveAsset(self.partialId), "/sh010/v2")
+        self.assertEqual(plugin.tk.evaluations, 0)
+
+    def test_manifest_follows_scene(self):
+        plugin = self.makePlugin()
+        self.assertEqual(plugin.resolveAsset(self.partialId), "/sh010/v2")
+
+        FarmAPI.file_name = os.path.join(self.tempDir, "sh020.katana")
+        self.assertEqual(plugin.resolveAsset(make_asset_id("sh010", 1)), "/sh010/v1")
+        self.assertEqual(plugin.tk.evaluations, 1)
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        os.environ["SHOTGUN_ASSET_PLUGIN_STATS"] = "1"
+        try:
+            self.module = load_asset_plugin()
+        finally:
+            # Nothing is dumped when the tests exit
+            del os.environ["SHOTGUN_ASSET_PLUGIN_STATS"]
+        self.plugin = self.module.ShotgunAssetPlugin()
+        self.plugin.tk = FakeTank()
+
+    def test_each_call_counted_once(self):
+        assetId = make_asset_id("sh030", 1).replace(" ", "")
+        self.plugin.resolveAssetVersion(make_asset_id("sh010"))
+        self.plugin.resolveAssetVersions([make_asset_id("sh020")])
+        self.plugin.resolvePath(assetId, 1)
+        self.plugin.resolvePathRange(assetId, 1, 2)
+        self.plugin.resolveAssets([assetId])
+        self.plugin.resolveAllAssets("-i " + assetId)
+        methods = self.plugin.getStats()["methods"]
+
+        for name in ("resolveAssetVersion", "resolveAssetVersions", "resolvePath",
+                     "resolvePathRange", "resolveAssets", "resolveAllAssets"):
+            self.assertEqual(methods[name]["calls"], 1, name)
+        self.assertNotIn("resolveAsset", methods)
+        self.assertNotIn("isAssetId", methods)
+
+    def test_only_asset_ids_recorded_as_slowest(self):
+        assetId = make_asset_id("sh010", 1).replace(" ", "")
+        self.plugin.resolveAsset(assetId)
+        self.plugin.isAssetId("/show/sh010/plate.exr")
+        self.plugin.resolveAllAssets("-i " + assetId)
+        self.plugin.resolveAssets([assetId])
+        slowest = self.plugin.getStats()["slowest"]
+
+        self.assertEqual([call["asset_id"] for call in slowest], [assetId])
+
+    def test_stats_calls_not_counted(self):
+        self.plugin.getStats()
+        self.assertNotIn("getStats", self.plugin.getStats()["methods"])
+
+
+class TestLazyToolkit(unittest.TestCase):
+
+    # Seconds the stand-in Toolkit takes to deserialize a context
+    DESERIALIZE_DELAY = 0.5
+
+    def test_registration_does_not_start_toolkit(self):
+        output = run_python("""
+import imp
+import json
+import sys
+import time
+
+start = time.time()
+imp.load_source("ShotgunAssetPlugin", %r)
+registration = time.time() - start
+toolkitImported = "tank" in sys.modules or "sgtk" in sys.modules
+
+import AssetAPI
+import tank.context
+plugin = AssetAPI.g_plugins["Shotgun"]
+deserializedAtRegistration = len(tank.context.g_deserialized)
+start = time.time()
+plugin.tk
+firstUse = time.time() - start
+
+print json.dumps({
+    "registration": registration,
+    "toolkitImported": toolkitImported,
+    "deserializedAtRegistration": deserializedAtRegistration,
+    "deserialized": len(tank.context.g_deserialized),
+    "firstUse": firstUse,
+})
+""" % ASSET_PLUGIN_PATH, env={
+            "TANK_CONTEXT": pickle.dumps({"project": {"type": "Project", "id": 1}}),
+            "TANK_STUB_DESERIALIZE_DELAY": str(self.DESERIALIZE_DELAY),
+        })
+        result = json.loads(output)
+
+        self.assertFalse(result["toolkitImported"])
+        self.assertEqual(result["deserializedAtRegistration"], 0)
+        # The cost of the context moved from the import to the first use
+        self.assertLess(result["registration"], self.DESERIALIZE_DELAY)
+        self.assertEqual(result["deserialized"], 1)
+        self.assertGreaterEqual(result["firstUse"], self.DESERIALIZE_DELAY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the command palette search.
+"""
+import unittest
+
+import helpers
+from tk_katana.command_palette import CommandIndex, CommandPalette
+
+
+class FakeAppCommand(object):
+
+    def __init__(self, name, app_name):
+        self.name = name
+        self.app_name = app_name
+
+
+class TestCommandIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = CommandIndex()
+        self.index.update([
+            FakeAppCommand("Publish...", "Publisher"),
+            FakeAppCommand("File Open...", "Workfiles"),
+            FakeAppCommand("File Save...", "Workfiles"),
+            FakeAppCommand("Créer un plan...", "Planification"),
+        ])
+
+    def test_prefix_and_trigram_search(self):
+        self.assertEqual(self.index.search("file"), ["File Open...", "File Save..."])
+        self.assertEqual(self.index.search("sav"), ["File Save..."])
+        self.assertEqual(self.index.search("lis"), ["Publish..."])
+        self.assertEqual(self.index.search("ublis"), ["Publish..."])
+
+    def test_fuzzy_search(self):
+        self.assertEqual(self.index.search("flopn"), ["File Open..."])
+
+    def test_non_ascii_queries(self):
+        self.assertEqual(self.index.search(u"cré"), ["Créer un plan..."])
+        self.assertEqual(self.index.search(u"créer plan"), ["Créer un plan..."])
+        self.assertEqual(self.index.search(u"\xfc"), [])
+
+    def test_incremental_update(self):
+        self.index.update([FakeAppCommand("File Open...", "Workfiles")])
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index.search("pub"), [])
+
+
+class TestCommandPalette(unittest.TestCase):
+
+    def test_run_typed_command(self):
+        index = CommandIndex()
+        index.update([FakeAppCommand("Créer un plan...", "Planification")])
+        run = []
+        palette = CommandPalette(index, run.append)
+        palette._line_edit.textChanged.emit(u"cré")
+        palette._line_edit.returnPressed.emit()
+        self.assertEqual(run, ["Créer un plan..."])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Tests of the engine refresh run when a scene of another context is opened.
+"""
+import sys
+import unittest
+from StringIO import StringIO
+
+import tank
+import tank.platform
+import tk_katana
+
+
+class FakeEngine(object):
+
+    context_change_allowed = True
+
+    def __init__(self, context):
+        self.context = context
+        self.messages = []
+
+    def log_info(self, msg):
+        self.messages.append(msg)
+
+
+class TestEngineRefresh(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FakeEngine("Shot sh010")
+        tank.platform.g_current_engine = self.engine
+        self._change_context = tank.platform.change_context
+        self._stdout = sys.stdout
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self._stdout
+        tank.platform.change_context = self._change_context
+        tank.platform.g_current_engine = None
+
+    def refresh(self, new_context):
+        getattr(tk_katana, "__engine_refresh")(None, new_context)
+        return sys.stdout.getvalue()
+
+    def test_context_changed_in_place(self):
+        self.assertEqual(self.refresh("Shot sh020"), "")
+        self.assertEqual(self.engine.context, "Shot sh020")
+        self.assertEqual(len(self.engine.messages), 1)
+
+    def test_context_without_engine_disables_toolkit(self):
+        def change_context(new_context):
+            raise tank.TankEngineInitError("no tk-katana engine in Shot sh020")
+        tank.platform.change_context = change_context
+
+        output = self.refresh("Shot sh020")
+        self.assertIn("Toolkit is disabled: no tk-katana engine", output)
+        self.assertNotIn("caught an error", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+Tests of the deferred initialization of apps.
+"""
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from tank.platform import application
+from tk_katana.deferred_apps import DeferredAppLoader
+
+
+class FakeApp(application.Application):
+
+    def __init__(self, engine, instance_name, command_names):
+        self.engine = engine
+        self.instance_name = instance_name
+        self.version = "v1.0.0"
+        self.command_names = command_names
+        self.initialized = False
+
+    def init_app(self):
+        self.initialized = True
+        for name in self.command_names:
+            self.engine.register_command(name, lambda: None, {"type": "default"})
+
+
+class StartupApp(FakeApp):
+
+    def post_engine_init(self):
+        # e.g. showing the app at startup
+        self.engine.shown.append(self.instance_name)
+
+
+class ContextApp(FakeApp):
+
+    def post_context_change(self, old_context, new_context):
+        # e.g. reloading what the app shows for the new context
+        self.engine.shown.append(self.instance_name)
+
+
+class FakeEngine(object):
+
+    def __init__(self, cache_location):
+        self.cache_location = cache_location
+        self.apps = {}
+        self.commands = {}
+        # Every command registered so far, like Toolkit keeps them to register
+        # the commands of reused apps again after a context change
+        self.command_pool = {}
+        self.shown = []
+
+    def register_command(self, name, callback, properties):
+        self.commands[name] = {"callback": callback, "properties": properties}
+        self.command_pool[name] = self.commands[name]
+
+    def rebuild_katana_menu(self):
+        pass
+
+    def log_debug(self, msg):
+        pass
+
+    def log_error(self, msg):
+        pass
+
+    def log_warning(self, msg):
+        pass
+
+
+class TestDeferredApps(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_location = tempfile.mkdtemp()
+        self.get_application = application.get_application
+
+    def tearDown(self):
+        application.get_application = self.get_application
+        shutil.rmtree(self.cache_location)
+
+    def start_engine(self, app_classes):
+        """
+        Starts an engine with deferred apps, like Toolkit does, and returns
+        the engine, its apps keyed by instance name and the loader.
+        """
+        engine = FakeEngine(self.cache_location)
+        apps = {}
+
+        def get_application(instance_name):
+            app_class, command_names = app_classes[instance_name]
+            return app_class(engine, instance_name, command_names)
+        application.get_application = get_application
+
+        loader = DeferredAppLoader(engine)
+        loader.install()
+        for instance_name in sorted(app_classes):
+            app = application.get_application(instance_name)
+            app.init_app()
+            apps[instance_name] = app
+        engine.apps = dict(apps)
+        loader.uninstall()
+        loader.register_placeholder_commands()
+        for app in apps.values():
+            app.post_engine_init()
+        return engine, apps, loader
+
+    def change_context(self, engine, loader):
+        """
+        Changes the context of the engine like Toolkit does: the commands of
+        the apps it reuses are registered again.
+        """
+        loader.prepare_context_change()
+        for app in engine.apps.values():
+            app.pre_context_change("Shot sh010", "Shot sh020")
+        reused_apps = engine.apps.values()
+        engine.commands = dict(
+            (name, command) for name, command in engine.command_pool.items()
+            if command["properties"]["app"] in reused_apps
+        )
+        for app in reused_apps:
+            app.post_context_change("Shot sh010", "Shot sh020")
+        loader.follow_context_change()
+
+    def test_deferred_until_command_runs(self):
+        app_classes = {"tk-multi-loader2": (FakeApp, ["Load..."])}
+        self.start_engine(app_classes)
+        engine, apps, loader = self.start_engine(app_classes)
+        app = apps["tk-multi-loader2"]
+        self.assertFalse(app.initialized)
+        self.assertTrue(engine.commands["Load..."]["properties"]["deferred"])
+
+        engine.commands["Load..."]["callback"]()
+        self.assertTrue(app.initialized)
+        self.assertEqual(loader.pending_apps, [])
+
+    def test_apps_without_commands_not_deferred(self):
+        app_classes = {"tk-multi-breakdown": (FakeApp, [])}
+        self.start_engine(app_classes)
+        engine, apps, loader = self.start_engine(app_classes)
+        self.assertTrue(apps["tk-multi-breakdown"].initialized)
+        self.assertEqual(loader.pending_apps, [])
+
+    def test_apps_with_post_engine_init_not_deferred(self):
+        app_classes = {"tk-multi-workfiles2": (StartupApp, ["File Open..."])}
+        self.start_engine(app_classes)
+        engine, apps, loader = self.start_engine(app_classes)
+        self.assertTrue(apps["tk-multi-workfiles2"].initialized)
+        self.assertEqual(engine.shown, ["tk-multi-workfiles2"])
+        self.assertEqual(loader.pending_apps, [])
+
+    def test_deferred_across_context_change(self):
+        app_classes = {"tk-multi-loader2": (FakeApp, ["Load..."])}
+        self.start_engine(app_classes)
+        engine, apps, loader = self.start_engine(app_classes)
+        self.change_context(engine, loader)
+
+        self.assertFalse(apps["tk-multi-loader2"].initialized)
+        self.assertEqual(loader.pending_apps, ["tk-multi-loader2"])
+        engine.commands["Load..."]["callback"]()
+        self.assertTrue(apps["tk-multi-loader2"].initialized)
+
+    def test_apps_not_reused_forgotten(self):
+        app_classes = {"tk-multi-loader2": (FakeApp, ["Load..."])}
+        self.start_engine(app_classes)
+        engine, apps, loader = self.start_engine(app_classes)
+        # Toolkit creates the app again in the new context
+        del engine.apps["tk-multi-loader2"]
+        self.change_context(engine, loader)
+
+        self.assertEqual(loader.pending_apps, [])
+        self.assertNotIn("Load...", engine.commands)
+
+    def test_apps_acting_on_context_change_initialized(self):
+        app_classes = {
+            "tk-multi-loader2": (FakeApp, ["Load..."]),
+            "tk-multi-shotgunpanel": (ContextApp, ["Shotgun Panel..."]),
+        }
+        self.start_engine(app_classes)
+        engine, apps, loader = self.start_engine(app_classes)
+        self.assertEqual(loader.pending_apps, ["tk-multi-loader2", "tk-multi-shotgunpanel"])
+        self.change_context(engine, loader)
+
+        self.assertTrue(apps["tk-multi-shotgunpanel"].initialized)
+        self.assertEqual(engine.shown, ["tk-multi-shotgunpanel"])
+        self.assertEqual(loader.pending_apps, ["tk-multi-loader2"])
+        self.assertFalse(engine.commands["Shotgun Panel..."]["properties"].get("deferred"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+Tests that batch Katana sessions start the engine without any UI module.
+"""
+import json
+import os
+import unittest
+
+from helpers import ROOT_PATH, run_python
+
+
+# Modules only batch sessions must not import
+UI_MODULES = (
+    "PySide", "PySide2", "PyQt4", "PyQt5", "UI4", "fakeqt",
+    "Katana.QtCore", "Katana.QtGui", "Katana.QtWidgets",
+    "tk_katana.menu_generation", "tk_katana.panels",
+    "tk_katana.command_palette", "tk_katana.icons",
+)
+
+
+class TestHeadless(unittest.TestCase):
+
+    def test_engine_start_imports_no_ui_module(self):
+        output = run_python("""
+import imp
+import json
+import sys
+
+import tank.platform
+
+engine_module = imp.load_source("tk_katana_engine", %r)
+engine = engine_module.KatanaEngine()
+
+print json.dumps({
+    "has_ui": engine.has_ui,
+    "qt_probes": tank.platform.g_qt_probes,
+    "tk_katana": "tk_katana" in sys.modules,
+    "modules": sorted(sys.modules),
+})
+""" % os.path.join(ROOT_PATH, "engine.py"))
+        result = json.loads(output)
+
+        self.assertFalse(result["has_ui"])
+        self.assertTrue(result["tk_katana"])
+        self.assertEqual(result["qt_probes"], [])
+        imported = [
+            name for name in result["modules"]
+            if any(name == module or name.startswith(module + ".") for module in UI_MODULES)
+        ]
+        self.assertEqual(imported, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
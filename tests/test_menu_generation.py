@@ -0,0 +1,66 @@
+"""
+Tests of the Shotgun menu, built with fake Qt classes.
+"""
+import unittest
+
+import fakeqt
+from helpers import FakeMenuEngine, get_menu_generator_class
+
+
+class TestMenuUpdates(unittest.TestCase):
+
+    def setUp(self):
+        self.generator_class = get_menu_generator_class()
+
+    def make_engine(self, switch):
+        """
+        Returns the engine after the given context switch, alternating between
+        two sets of apps.
+        """
+        if switch % 2:
+            return FakeMenuEngine(12, 3, favourite_count=2, context="Shot sh%03d" % switch)
+        return FakeMenuEngine(10, 4, favourite_count=5, context="Shot sh%03d" % switch)
+
+    def open_app_menus(self, generator):
+        """
+        Opens every sub menu, which creates their actions.
+        """
+        for action in generator.root_menu.actions():
+            if action.menu() is not None:
+                action.menu().aboutToShow.emit()
+
+    def get_menu_titles(self, generator):
+        return [action.text() for action in generator.root_menu.actions()]
+
+    def test_update_keeps_unchanged_actions(self):
+        generator = self.generator_class(self.make_engine(0), "Shotgun")
+        actions = generator.root_menu.actions()
+        generator.update(self.make_engine(2))
+        self.assertEqual(generator.root_menu.actions(), actions)
+        self.assertEqual(generator._context_menu.title(), "Shot sh002")
+
+    def test_no_actions_leak_across_context_switches(self):
+        generator = self.generator_class(self.make_engine(0), "Shotgun")
+        self.open_app_menus(generator)
+        titles = self.get_menu_titles(generator)
+        live_actions = len(fakeqt.g_live_actions)
+
+        for switch in range(1, 101):
+            generator.update(self.make_engine(switch))
+            self.open_app_menus(generator)
+        generator.update(self.make_engine(0))
+        self.open_app_menus(generator)
+
+        self.assertEqual(self.get_menu_titles(generator), titles)
+        self.assertEqual(len(fakeqt.g_live_actions), live_actions)
+
+    def test_destroy_menu(self):
+        generator = self.generator_class(self.make_engine(0), "Shotgun")
+        generator.destroy_menu()
+        self.assertEqual(generator.root_menu.actions(), [])
+        generator.update()
+        self.assertEqual(generator._context_menu.title(), "Shot sh000")
+
+
+if __name__ == "__main__":
+    unittest.main()
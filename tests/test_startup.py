@@ -0,0 +1,251 @@
+"""
+Tests of the launcher's rez package scan and its caches.
+"""
+import os
+import sys
+import json
+import stat
+import shutil
+import tempfile
+import unittest
+
+from helpers import FAKE_REZ_PATH, ROOT_PATH, STARTUP_PATH, load_startup, run_python
+from tank.context import Context
+
+
+class LauncherTestCase(unittest.TestCase):
+    """
+    Runs each test with its own temporary directory for the caches and two
+    rez package repositories, rez being found with a rez-env stand-in.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self._tempdir = tempfile.tempdir
+        tempfile.tempdir = self.temp_dir
+        self._environ = dict(os.environ)
+        self._sys_path = list(sys.path)
+
+        self.repositories = []
+        for name, versions in (("studio", ["3.0v7"]), ("site", ["3.0v7", "3.1v2"])):
+            repository = os.path.join(self.temp_dir, name)
+            for version in versions:
+                os.makedirs(os.path.join(repository, "katana", version))
+            self.repositories.append(repository)
+        os.environ["REZ_PACKAGES_PATH"] = os.pathsep.join(self.repositories)
+        os.environ["PYTHONPATH"] = "/toolkit/python"
+
+        self.startup = load_startup()
+        self.rez_root_lookups = []
+
+        test = self
+
+        class TestLauncher(self.startup.KatanaLauncher):
+
+            def _find_rez_module_root(self):
+                test.rez_root_lookups.append(True)
+                return super(TestLauncher, self)._find_rez_module_root()
+
+            def get_rez_root_command(self):
+                return "echo %s" % FAKE_REZ_PATH
+
+        self.context = Context({
+            "project": {"type": "Project", "id": 1},
+            "entity": {"type": "Shot", "id": 2},
+            "user": {"type": "HumanUser", "id": 3},
+            "session_token": "secret",
+        })
+        self.launcher = TestLauncher(context=self.context, disk_location=ROOT_PATH)
+
+    def tearDown(self):
+        self.unload_rez()
+        os.environ.clear()
+        os.environ.update(self._environ)
+        tempfile.tempdir = self._tempdir
+        shutil.rmtree(self.temp_dir)
+
+    def unload_rez(self):
+        for name in list(sys.modules):
+            if name == "rez" or name.startswith("rez."):
+                del sys.modules[name]
+        sys.path[:] = self._sys_path
+
+    def read_rez_cache(self):
+        path = self.launcher._get_cache_path(self.launcher.REZ_CACHE_FILE_NAME)
+        with open(path) as cache_file:
+            return json.load(cache_file)
+
+
+class TestRezScan(LauncherTestCase):
+
+    def test_finds_packages_of_all_repositories(self):
+        self.assertEqual(
+            self.launcher._find_rez_packages("katana"), ["katana-3.0v7", "katana-3.1v2"])
+
+    def test_scan_keeps_rez_root_in_cache(self):
+        self.launcher._find_rez_packages("katana")
+        cache = self.read_rez_cache()
+
+        self.assertEqual(cache["rez_root"]["value"], FAKE_REZ_PATH)
+        for repository in self.repositories:
+            self.assertIn("katana:%s" % repository, cache)
+
+    def test_rez_root_found_once(self):
+        self.launcher._find_rez_packages("katana")
+        # As if in a new launcher process, with rez not imported yet
+        self.unload_rez()
+        os.utime(os.path.join(self.repositories[0], "katana"), (0, 0))
+        self.launcher._find_rez_packages("katana")
+
+        self.assertEqual(len(self.rez_root_lookups), 1)
+
+    def test_slow_repository_skipped(self):
+        self.launcher.REZ_REPOSITORY_TIMEOUT = 0.5
+        # rez is made importable by the scan, then the site repository hangs
+        self.launcher._find_rez_packages("katana")
+        from rez import package_search
+        os.utime(os.path.join(self.repositories[1], "katana"), (0, 0))
+        os.makedirs(os.path.join(self.repositories[0], "katana", "4.0v1"))
+        package_search.g_search_delays[self.repositories[1]] = 2
+        try:
+            packages = self.launcher._find_rez_packages("katana")
+        finally:
+            package_search.g_search_delays.clear()
+
+        # The site repository's last results are used
+        self.assertEqual(packages, ["katana-3.0v7", "katana-4.0v1", "katana-3.1v2"])
+        self.assertEqual(len(self.rez_root_lookups), 1)
+
+
+class FakeShotgun(object):
+    """
+    A Shotgun connection with the given Software entity codes, counting the
+    queries it answers.
+    """
+
+    base_url = "https://studio.shotgunstudio.com"
+
+    def __init__(self, codes):
+        self.codes = codes
+        self.queries = 0
+
+    def find(self, entity_type, filters, fields=None):
+        self.queries += 1
+        [[field, operator, codes]] = filters
+        return [{"type": entity_type, "code": code} for code in codes if code in self.codes]
+
+
+class TestSoftwareLookup(LauncherTestCase):
+
+    def setUp(self):
+        super(TestSoftwareLookup, self).setUp()
+        for version in ("3.2v1", "3.5v2", "4.0v1"):
+            os.makedirs(os.path.join(self.repositories[1], "katana", version))
+        self.launcher.shotgun = FakeShotgun(["katana 3.0v7", "katana 3.5v2", "katana 4.0v1"])
+
+    def scan_versions(self):
+        return [software.version for software in self.launcher.scan_software()]
+
+    def test_one_query_per_scan(self):
+        self.assertEqual(self.scan_versions(), ["3.0v7", "3.5v2", "4.0v1"])
+        self.assertEqual(self.launcher.shotgun.queries, 1)
+
+    def test_repeat_scan_not_queried(self):
+        self.scan_versions()
+        self.assertEqual(self.scan_versions(), ["3.0v7", "3.5v2", "4.0v1"])
+        self.assertEqual(self.launcher.shotgun.queries, 1)
+
+    def test_queried_again_once_expired(self):
+        self.scan_versions()
+        self.launcher.SOFTWARE_CACHE_TTL = -1
+        self.assertEqual(self.scan_versions(), ["3.0v7", "3.5v2", "4.0v1"])
+        self.assertEqual(self.launcher.shotgun.queries, 2)
+
+
+class TestLaunch(LauncherTestCase):
+
+    def prepare_launch(self):
+        return self.launcher.prepare_launch("/opt/katana3.0v7/katana", "").environment
+
+    def test_context_serialized_for_each_launch(self):
+        self.prepare_launch()
+        self.context.data["session_token"] = "renewed"
+        environment = self.prepare_launch()
+
+        self.assertEqual(
+            self.startup.tk_katana_context.deserialize(environment["TANK_CONTEXT"]),
+            self.context)
+        self.assertEqual(environment["TANK_ENGINE"], "tk-katana")
+
+    def test_nothing_written_to_disk(self):
+        self.prepare_launch()
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ["site", "studio"])
+
+
+class TestRezCacheFile(LauncherTestCase):
+
+    def setUp(self):
+        super(TestRezCacheFile, self).setUp()
+        self.launcher._find_rez_packages("katana")
+        self.path = self.launcher._get_cache_path(self.launcher.REZ_CACHE_FILE_NAME)
+
+    def test_only_accessible_to_user(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(self.path)).st_mode) & 0o077, 0)
+
+    def test_cache_dir_of_another_user_ignored(self):
+        os.chmod(os.path.dirname(self.path), 0o755)
+        real_getuid = os.getuid
+        os.getuid = lambda: real_getuid() + 1
+        try:
+            self.assertEqual(self.launcher._read_cache(self.path), {})
+            self.launcher._write_cache(self.path, {"rez_root": "/evil"})
+        finally:
+            os.getuid = real_getuid
+
+        self.assertNotIn("evil", open(self.path).read())
+
+    def test_clear_caches(self):
+        self.assertEqual(self.startup.KatanaLauncher.clear_caches(), [self.path])
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestContextRegistry(unittest.TestCase):
+
+    def test_each_engine_copy_uses_its_own_registry(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            # Another version of the engine
+            registry_dir = os.path.join(temp_dir, "resources", "Katana", "python")
+            os.makedirs(registry_dir)
+            shutil.copy(STARTUP_PATH, temp_dir)
+            shutil.copy(os.path.join(ROOT_PATH, "resources", "Katana", "python",
+                                     "tk_katana_context.py"), registry_dir)
+
+            output = run_python("""
+import imp
+import json
+import sys
+
+paths = list(sys.path)
+first = imp.load_source("first_startup", %r)
+second = imp.load_source("second_startup", %r)
+print json.dumps({
+    "shared": first.tk_katana_context is second.tk_katana_context,
+    "second_file": second.tk_katana_context.__file__,
+    "global": "tk_katana_context" in sys.modules,
+    "paths_changed": sys.path != paths,
+})
+""" % (STARTUP_PATH, os.path.join(temp_dir, "startup.py")))
+        finally:
+            shutil.rmtree(temp_dir)
+        result = json.loads(output)
+
+        self.assertFalse(result["shared"])
+        self.assertTrue(result["second_file"].startswith(registry_dir))
+        self.assertFalse(result["global"])
+        self.assertFalse(result["paths_changed"])
+
+
+if __name__ == "__main__":
+    unittest.main()